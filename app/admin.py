@@ -1,16 +1,19 @@
-from io import TextIOWrapper
-
 from django.conf.urls import url
 from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import Group as DjangoGroup
 from django.contrib.auth.models import User
-from django.shortcuts import redirect, render
-
-from app.exam_tools import ExamUploader
-from app.forms import UploadExamFileForm
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import require_POST
+
+from app.exam_tools import QuestionSetGenerator
+from app.forms import AnswerChoiceFormSet, UploadExamFileForm
+from app.jobs import ImportJobRunner
 from app.models import (UserX, RegistrationCode, Exam, Group, GroupExamLink,
-                        ExamCode, Question, AnswerChoice)
+                        ExamCode, Question, AnswerChoice, ImportJob,
+                        ExamAttempt, AnswerRecord)
 
 
 class UserXInline(admin.StackedInline):
@@ -27,6 +30,7 @@ class UserAdmin(BaseUserAdmin):
     )
     readonly_fields = ('is_staff', 'is_superuser', 'date_joined', 'last_login')
     inlines = (UserXInline,)
+    list_select_related = ('userx',)
 
     def code(self, obj):
         return obj.userx.code
@@ -76,6 +80,26 @@ class GroupAdmin(admin.ModelAdmin):
     filter_horizontal = ('members',)
     inlines = (GroupExamLinkInline,)
 
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        if db_field.name == 'members':
+            # users are displayed with their codes
+            kwargs['queryset'] = User.objects.select_related('userx')
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
+
+
+class GroupExamLinkAdmin(admin.ModelAdmin):
+    list_display = ('exam', 'group', 'due_date', 'creation_date')
+    list_filter = ('exam', 'group')
+    actions = ('pregenerate_question_sets',)
+
+    def pregenerate_question_sets(self, request, queryset):
+        count = 0
+        for link in queryset.select_related('exam', 'group'):
+            count += QuestionSetGenerator.pregenerate(link)
+        messages.success(request, 'Generated {} question sets'.format(count))
+    pregenerate_question_sets.short_description = \
+        'Pregenerate question sets for group members'
+
 
 class ExamCodeInline(admin.TabularInline):
     model = ExamCode
@@ -97,6 +121,15 @@ class ExamAdmin(admin.ModelAdmin):
             url(r'^upload/$',
                 self.admin_site.admin_view(self.upload_view),
                 name="exam_upload"),
+            url(r'^upload/([0-9]+)/$',
+                self.admin_site.admin_view(self.upload_status_view),
+                name="exam_upload_status"),
+            url(r'^upload/([0-9]+)/progress/$',
+                self.admin_site.admin_view(self.upload_progress_view),
+                name="exam_upload_progress"),
+            url(r'^upload/([0-9]+)/cancel/$',
+                self.admin_site.admin_view(self.upload_cancel_view),
+                name="exam_upload_cancel"),
         ]
         return my_urls + urls
 
@@ -104,20 +137,17 @@ class ExamAdmin(admin.ModelAdmin):
         if request.method == 'POST':
             form = UploadExamFileForm(request.POST, request.FILES)
             if form.is_valid():
-                text_file = TextIOWrapper(
-                    request.FILES['file'],
-                    encoding='utf8', newline=''
-                )
-                exam_uploader = ExamUploader(
-                    form.cleaned_data['exam_name'],
-                    form.cleaned_data['num_questions']
+                job = ImportJob.objects.create(
+                    file=request.FILES['file'],
+                    exam_name=form.cleaned_data['exam_name'],
+                    num_questions=form.cleaned_data['num_questions'],
+                    has_headers=form.cleaned_data['has_headers'],
+                    exam=form.cleaned_data['exam']
                 )
-                exam_uploader.load_csv(
-                    text_file, form.cleaned_data['has_headers']
-                )
-                exam_uploader.save_to_db()
-                messages.success(request, 'Test uploaded successfully')
-                return redirect('admin:app_exam_changelist')
+                if '_addanother' in request.POST:
+                    messages.success(request, 'Test queued for upload')
+                    return redirect('admin:exam_upload')
+                return redirect('admin:exam_upload_status', job.id)
         else:
             form = UploadExamFileForm()
         context = dict(
@@ -131,10 +161,42 @@ class ExamAdmin(admin.ModelAdmin):
             request, 'admin/app/exam/upload_form.html', context
         )
 
+    def upload_status_view(self, request, job_id):
+        job = get_object_or_404(ImportJob, id=job_id)
+        context = dict(
+            admin.site.each_context(request),
+            has_change_permission=True,
+            title='Upload of {}'.format(job.exam_name),
+            job=job
+        )
+        return render(
+            request, 'admin/app/exam/upload_status.html', context
+        )
+
+    def upload_progress_view(self, request, job_id):
+        job = get_object_or_404(ImportJob, id=job_id)
+        return JsonResponse({
+            'status': job.status,
+            'status_display': job.get_status_display(),
+            'total_rows': job.total_rows,
+            'saved_rows': job.saved_rows,
+            'message': job.message,
+            'finished': job.status in {
+                ImportJob.DONE, ImportJob.FAILED, ImportJob.CANCELLED
+            }
+        })
+
+    @method_decorator(require_POST)
+    def upload_cancel_view(self, request, job_id):
+        ImportJobRunner.cancel(job_id)
+        return redirect('admin:exam_upload_status', job_id)
+
 
 class AnswerChoiceInline(admin.TabularInline):
     model = AnswerChoice
+    formset = AnswerChoiceFormSet
     extra = 4
+    max_num = Question.MAX_ANSWERS
 
 
 class QuestionAdmin(admin.ModelAdmin):
@@ -145,4 +207,40 @@ class QuestionAdmin(admin.ModelAdmin):
 
 admin.site.register(Exam, ExamAdmin)
 admin.site.register(Group, GroupAdmin)
+admin.site.register(GroupExamLink, GroupExamLinkAdmin)
 admin.site.register(Question, QuestionAdmin)
+
+
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('exam_name', 'status', 'saved_rows', 'total_rows',
+                    'creation_date')
+    list_filter = ('status',)
+    readonly_fields = ('status', 'total_rows', 'saved_rows', 'message',
+                       'exam', 'heartbeat_date', 'creation_date')
+
+
+admin.site.register(ImportJob, ImportJobAdmin)
+
+
+class AnswerRecordInline(admin.TabularInline):
+    model = AnswerRecord
+    fields = ('question', 'answer_mask', 'score', 'rating_change',
+              'answer_date')
+    readonly_fields = fields
+    can_delete = False
+    extra = 0
+    max_num = 0
+
+
+class ExamAttemptAdmin(admin.ModelAdmin):
+    list_display = ('user', 'exam', 'start_date', 'finish_date', 'score',
+                    'start_rating', 'final_rating')
+    list_filter = ('exam',)
+    list_select_related = ('user__userx', 'exam')
+    readonly_fields = ('attempt_id', 'user', 'exam', 'question_ids',
+                       'num_questions', 'start_rating', 'final_rating',
+                       'score', 'start_date', 'finish_date')
+    inlines = (AnswerRecordInline,)
+
+
+admin.site.register(ExamAttempt, ExamAttemptAdmin)
@@ -0,0 +1,9 @@
+from django.apps import AppConfig as BaseAppConfig
+
+
+class AppConfig(BaseAppConfig):
+    name = 'app'
+
+    def ready(self):
+        # connects the signal handlers
+        import app.signals  # noqa
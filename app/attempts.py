@@ -0,0 +1,280 @@
+import uuid
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db.models import F, OuterRef, Prefetch, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from app.models import (AnswerChoice, AnswerRecord, ExamAttempt, Question,
+                        QuestionSet)
+from app.ratings import rating_updates
+
+
+class QuestionSnapshot(namedtuple(
+        'QuestionSnapshot',
+        ['id', 'type', 'text', 'rating', 'answers', 'correct_mask'])):
+    """Question of the attempt with its answers ordered by id."""
+    __slots__ = ()
+
+    def get_answer_mask(self, answer):
+        """
+        :param answer: id or list of ids of the chosen answers
+        :type answer: int | list[int] | None
+        :return: bitmask of the chosen answers
+        :rtype: int
+        """
+        if answer is None:
+            return 0
+        if not isinstance(answer, list):
+            answer = [answer]
+        chosen = set(answer)
+        return Question.get_correct_mask(
+            ans_id in chosen for (ans_id, _) in self.answers
+        )
+
+
+class AttemptToken(namedtuple('AttemptToken', ['attempt_id', 'position'])):
+    """
+    Compact state of the exam attempt kept in the session: the id of the
+    attempt and the number of answered questions. The attempt itself is
+    kept on the server, so a token taken from an older session cannot
+    answer a question twice or reopen a finished attempt.
+    """
+    __slots__ = ()
+
+    def dumps(self):
+        return ':'.join(str(value) for value in self)
+
+    @classmethod
+    def loads(cls, token):
+        """
+        :param str token: token created by ``dumps``
+        :rtype: AttemptToken
+        :raise ValueError: if the token is malformed
+        """
+        (attempt_id, *values) = token.split(':')
+        if not attempt_id:
+            raise ValueError('Missing attempt id')
+        return cls(attempt_id, *(int(value) for value in values))
+
+
+class AttemptSnapshot:
+    """
+    Copy of everything needed to show and grade the questions of a single
+    exam attempt. The snapshot is taken once when the exam is started and
+    kept in the cache, so answering questions does not query the question
+    bank.
+
+    Graded answers are queued and saved as ``AnswerRecord`` rows in
+    batches, so they outlive the snapshot. Attempts which are not finished
+    by the student are finished by the ``finish_stale_attempts`` command.
+    """
+
+    TIMEOUT = 6 * 60 * 60  # seconds the unfinished attempt is kept for
+    KEY = 'exam_attempt:{}'
+
+    def __init__(self, attempt_id, record_id, user_id, exam_id, exam_name,
+                 questions, user_rating, position=0):
+        """
+        :param str attempt_id: unique id of the attempt
+        :param int record_id: id of the ``ExamAttempt`` row
+        :param int user_id: id of the user taking the exam
+        :param int exam_id: id of the exam being taken
+        :param str exam_name: name of the exam being taken
+        :param questions: snapshots of questions in the order they are asked
+        :type questions: list[QuestionSnapshot]
+        :param user_rating: current rating of the user taking the exam
+        :param int position: number of answered questions
+        """
+        self.attempt_id = attempt_id
+        self.record_id = record_id
+        self.user_id = user_id
+        self.exam_id = exam_id
+        self.exam_name = exam_name
+        self.questions = questions
+        self.user_rating = user_rating
+        self.position = position
+
+    @property
+    def num_questions(self):
+        return len(self.questions)
+
+    @classmethod
+    def create(cls, exam, user, question_ids, user_rating):
+        """
+        Takes a snapshot of the questions drawn for the exam attempt and
+        stores it in the cache. A new attempt is also saved in the database
+        together with the ids of the drawn questions.
+
+        :param Exam exam: exam being started
+        :param User user: user starting the exam
+        :param question_ids: ids of the drawn questions
+        :type question_ids: list[int]
+        :param user_rating: rating of the user starting the exam
+        :return: the stored snapshot
+        :rtype: AttemptSnapshot
+        """
+        record = ExamAttempt.objects.create(
+            attempt_id=uuid.uuid4().hex, user=user, exam=exam,
+            question_ids=QuestionSet.join_ids(question_ids),
+            num_questions=len(question_ids), start_rating=user_rating
+        )
+        snapshot = cls(
+            attempt_id=record.attempt_id,
+            record_id=record.id,
+            user_id=user.id,
+            exam_id=exam.id,
+            exam_name=exam.name,
+            questions=cls._snapshot_questions(question_ids),
+            user_rating=user_rating
+        )
+        snapshot.save()
+        return snapshot
+
+    @classmethod
+    def restore(cls, attempt_id, user):
+        """
+        Takes the snapshot of the attempt again from the question ids and
+        the answers saved in the database, after the snapshot expired from
+        the cache. Questions deleted since the attempt was started are
+        left out.
+
+        :param str attempt_id: id of the attempt
+        :param User user: user taking the exam
+        :return: the stored snapshot or None if the attempt is finished or
+            does not exist or its exam was deleted
+        :rtype: AttemptSnapshot | None
+        """
+        record = (ExamAttempt.objects
+                             .select_related('exam')
+                             .filter(attempt_id=attempt_id, user=user,
+                                     finish_date=None)
+                             .first())
+        if record is None or record.exam is None:
+            return None
+        # the answers of the attempt may still be queued
+        rating_updates.flush()
+        answers = record.answers.values_list('question_id', 'rating_change')
+        answered = {question_id for (question_id, _) in answers}
+        questions = cls._snapshot_questions(record.split_ids())
+        snapshot = cls(
+            attempt_id=record.attempt_id,
+            record_id=record.id,
+            user_id=user.id,
+            exam_id=record.exam_id,
+            exam_name=record.exam.name,
+            questions=questions,
+            user_rating=(record.start_rating +
+                         sum(change for (_, change) in answers)),
+            # questions are answered in order
+            position=sum(q.id in answered for q in questions)
+        )
+        snapshot.save()
+        return snapshot
+
+    @classmethod
+    def load(cls, attempt_id):
+        """
+        :param str attempt_id: id of the attempt
+        :return: snapshot of the attempt or None if it expired
+        :rtype: AttemptSnapshot | None
+        """
+        return cache.get(cls.KEY.format(attempt_id))
+
+    def save(self):
+        cache.set(self.KEY.format(self.attempt_id), self, self.TIMEOUT)
+
+    @classmethod
+    def discard(cls, attempt_id):
+        cache.delete(cls.KEY.format(attempt_id))
+
+    def record_answers(self, answers):
+        """
+        Queues the graded answers to be saved with the rating changes they
+        cause, see ``app.ratings.RatingUpdateQueue``.
+
+        :param answers: answered question, bitmask of the chosen answers,
+            score of the answer and change of the user rating
+        :type answers: list[tuple[QuestionSnapshot, int, float, int]]
+        """
+        answer_date = timezone.now()
+        rating_updates.record_many([
+            (self.user_id, question.id, rating_change, AnswerRecord(
+                attempt_id=self.record_id, user_id=self.user_id,
+                question_id=question.id, answer_mask=answer_mask,
+                score=score, rating_change=rating_change,
+                answer_date=answer_date
+            ))
+            for (question, answer_mask, score, rating_change) in answers
+        ])
+
+    def finish(self):
+        """
+        Saves the result of the attempt. The snapshot should be discarded
+        afterwards.
+        """
+        self.finish_attempts(ExamAttempt.objects.filter(id=self.record_id))
+
+    @staticmethod
+    def finish_attempts(attempts):
+        """
+        Saves the result of the unfinished attempts, computed from their
+        recorded answers, with a single update. Finished attempts are left
+        unchanged.
+
+        :param attempts: attempts to finish
+        :type attempts: django.db.models.QuerySet
+        :return: number of finished attempts
+        :rtype: int
+        """
+        # the answers of the attempts may still be queued
+        rating_updates.flush()
+        answers = (AnswerRecord.objects
+                               .filter(attempt=OuterRef('pk'))
+                               .order_by()
+                               .values('attempt'))
+
+        def total(field):
+            return Coalesce(Subquery(
+                answers.annotate(total=Sum(field)).values('total'),
+                output_field=AnswerRecord._meta.get_field(field)
+            ), 0)
+
+        return attempts.filter(finish_date=None).update(
+            score=total('score'),
+            final_rating=F('start_rating') + total('rating_change'),
+            finish_date=timezone.now()
+        )
+
+    @classmethod
+    def _snapshot_questions(cls, question_ids):
+        """
+        :param question_ids: ids of the questions in the order they are asked
+        :type question_ids: list[int]
+        :return: snapshots of the existing questions in the same order
+        :rtype: list[QuestionSnapshot]
+        """
+        questions = (Question.objects
+                             .filter(id__in=question_ids)
+                             .prefetch_related(Prefetch(
+                                 'answers',
+                                 queryset=AnswerChoice.objects.order_by('id')
+                             )))
+        questions = {q.id: q for q in questions}
+        return [
+            cls._snapshot_question(questions[i])
+            for i in question_ids if i in questions
+        ]
+
+    @staticmethod
+    def _snapshot_question(question):
+        answers = question.answers.all()
+        return QuestionSnapshot(
+            id=question.id,
+            type=question.type,
+            text=question.text,
+            rating=question.rating,
+            answers=[(ans.id, ans.text) for ans in answers],
+            correct_mask=question.correct_mask
+        )
@@ -0,0 +1,19 @@
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+
+
+class UserProfileBackend(ModelBackend):
+    """
+    Authentication backend which loads the user of the session together
+    with the ``UserX`` profile in a single query, as the profile is used
+    by almost every view.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = (User._default_manager
+                        .select_related('userx')
+                        .get(pk=user_id))
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,29 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend for a database shared by several processes.
+
+    Pragmas given in the ``pragmas`` dict of the database ``OPTIONS`` are
+    set on every new connection. Transactions are started with
+    ``BEGIN IMMEDIATE``, so a transaction which reads before writing takes
+    the write lock up front and waits for it up to the ``timeout`` option.
+    A deferred transaction would fail with "database is locked" at once
+    when another process wrote in the meantime, regardless of the timeout.
+    """
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop('pragmas', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        pragmas = self.settings_dict['OPTIONS'].get('pragmas', {})
+        for (name, value) in pragmas.items():
+            conn.execute('PRAGMA {} = {}'.format(name, value))
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -0,0 +1,196 @@
+import gzip
+import json
+from collections import defaultdict
+
+from app.exam_tools import ExamUploader
+from app.models import AnswerChoice
+
+
+def open_bank_file(path, mode):
+    """
+    Opens the exam bank file for reading ('r') or writing ('w') as text,
+    compressed with gzip if the path ends with '.gz'.
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf8')
+    return open(path, mode, encoding='utf8')
+
+
+class ExamBankWriter:
+    """
+    Writes exams with their questions, answers and ratings to a file in
+    the newline delimited JSON format. The first line is a header with the
+    format name and version, then each exam line is followed by the lines
+    of its questions::
+
+        {"format": "lo01testy-exam-bank", "version": 1}
+        {"exam": {"name": ..., "num_questions": ..., "num_rows": ...}}
+        {"question": {"text": ..., "type": ..., "rating": ...,
+                      "answers": [[text, is_correct], ...]}}
+
+    Questions are read from the database in chunks, so the memory used
+    does not depend on the size of the exams.
+    """
+
+    FORMAT = 'lo01testy-exam-bank'
+    VERSION = 1
+    CHUNK_SIZE = 500  # number of questions read in a single query
+
+    def __init__(self, file):
+        """
+        :param file: text file the exams are written to
+        """
+        self._file = file
+        self._write_line({'format': self.FORMAT, 'version': self.VERSION})
+
+    def write_exam(self, exam):
+        """
+        :param Exam exam: exam written with all its questions
+        :return: number of written questions
+        :rtype: int
+        """
+        self._write_line({'exam': {
+            'name': exam.name,
+            'num_questions': exam.num_questions,
+            'num_rows': exam.questions.count()
+        }})
+        count = 0
+        last_id = 0
+        while True:
+            questions = list(
+                exam.questions.filter(id__gt=last_id)
+                              .order_by('id')
+                              .values_list('id', 'text', 'type', 'rating')
+                              [:self.CHUNK_SIZE]
+            )
+            if not questions:
+                return count
+            answers = defaultdict(list)
+            answer_rows = (AnswerChoice.objects
+                                       .filter(question_id__in=[
+                                           q[0] for q in questions
+                                       ])
+                                       .order_by('id')
+                                       .values_list('question_id', 'text',
+                                                    'is_correct'))
+            for (question_id, text, is_correct) in answer_rows:
+                answers[question_id].append([text, is_correct])
+            for (question_id, text, q_type, rating) in questions:
+                self._write_line({'question': {
+                    'text': text,
+                    'type': q_type,
+                    'rating': rating,
+                    'answers': answers[question_id]
+                }})
+            count += len(questions)
+            last_id = questions[-1][0]
+
+    def _write_line(self, data):
+        self._file.write(json.dumps(data, ensure_ascii=False))
+        self._file.write('\n')
+
+
+class ExamBankReader:
+    """
+    Reads exams written by ``ExamBankWriter`` and imports them with bulk
+    inserts. Questions are streamed from the file one exam at a time.
+    """
+
+    def __init__(self, file):
+        """
+        :param file: text file the exams are read from
+        :raise ValueError: if the file format or version is not supported
+        """
+        self._file = file
+        self._line_no = 0
+        header = self._read_line()
+        if (header is None or
+                header.get('format') != ExamBankWriter.FORMAT):
+            raise ValueError('Not an exam bank file')
+        if header.get('version') != ExamBankWriter.VERSION:
+            raise ValueError(
+                'Unsupported version {}'.format(header.get('version'))
+            )
+        self._pending = self._read_line()
+
+    def read_exams(self):
+        """
+        :return: generator of exam data and iterators of its questions;
+            each questions iterator is valid until the next exam is read
+        :rtype: collections.Iterator[
+            tuple[dict, collections.Iterator[QuestionRawData]]]
+        """
+        while self._pending is not None:
+            if 'exam' not in self._pending:
+                raise ValueError(
+                    'Line {}: exam expected'.format(self._line_no)
+                )
+            exam = self._pending['exam']
+            self._pending = None
+            questions = self._read_questions()
+            yield (exam, questions)
+            # skip the questions which were not read
+            for _ in questions:
+                pass
+
+    def import_exams(self, chunk_size=ExamUploader.CHUNK_SIZE):
+        """
+        Saves all the exams from the file as new exams.
+
+        :param int chunk_size: number of questions saved in a transaction
+        :return: created exams
+        :rtype: list[Exam]
+        """
+        exams = []
+        for (exam, questions) in self.read_exams():
+            uploader = ExamUploader(
+                exam['name'], exam['num_questions'], chunk_size=chunk_size
+            )
+            uploader.load_records(questions, exam['num_rows'])
+            exams.append(uploader.save_to_db())
+        return exams
+
+    def _read_questions(self):
+        """
+        :return: generator of the questions of the exam, validated like
+            the rows of an uploaded exam file
+        :rtype: collections.Iterator[QuestionRawData]
+        :raise ValueError: if a question is invalid
+        """
+        while True:
+            line = self._read_line()
+            if line is None or 'question' not in line:
+                self._pending = line
+                return
+            try:
+                question = self._validate_question(line['question'])
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError('Line {}: invalid question: {}'.format(
+                    self._line_no, e
+                ))
+            yield question
+
+    @staticmethod
+    def _validate_question(question):
+        """
+        :param dict question: question read from the file
+        :return: parsed question
+        :rtype: QuestionRawData
+        :raise ValueError: if the question is invalid
+        """
+        row = [question['text'], question['type'], question['rating']]
+        for (text, is_correct) in question['answers']:
+            row.extend((text, is_correct))
+        if not all(isinstance(text, str) for text in row[0:1] + row[3::2]):
+            raise ValueError('Texts must be strings')
+        return ExamUploader._validate_row(row)
+
+    def _read_line(self):
+        line = self._file.readline()
+        self._line_no += 1
+        if not line:
+            return None
+        try:
+            return json.loads(line)
+        except ValueError:
+            raise ValueError('Line {}: invalid JSON'.format(self._line_no))
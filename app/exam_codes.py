@@ -0,0 +1,88 @@
+import time
+import uuid
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from app.models import ExamCode
+
+
+class ExamCodeCache:
+    """
+    In-process cache of the active codes of each exam, so students
+    starting the exam at the same time do not query the database for
+    every entered code.
+
+    Codes of an exam are loaded once with their expiry dates and a code
+    is rejected and evicted as soon as it expires. Codes missing from the
+    cache are looked up in the database, so codes added in another process
+    are accepted immediately. Other changes are announced to all the
+    processes by a new version of the exam codes in the shared cache,
+    which is compared with the version the entry was loaded at.
+    """
+
+    TIMEOUT = 300  # seconds after which the codes of the exam are reloaded
+    VERSION_KEY = 'exam_codes_version:{}'
+
+    _exams = {}
+
+    @classmethod
+    def is_valid(cls, exam_id, code):
+        """
+        :param int exam_id: id of the exam being started
+        :param str code: code entered by the student
+        :return: whether the code of the exam exists and has not expired
+        :rtype: bool
+        """
+        (_, _, codes) = cls._get_entry(exam_id)
+        now = timezone.now()
+        expiry_date = codes.get(code)
+        if expiry_date is None:
+            expiry_date = (ExamCode.objects
+                                   .filter(exam_id=exam_id, code=code)
+                                   .filter(expiry_date__gt=now)
+                                   .values_list('expiry_date', flat=True)
+                                   .order_by('-expiry_date')
+                                   .first())
+            if expiry_date is None:
+                return False
+            codes[code] = expiry_date
+        if expiry_date <= now:
+            codes.pop(code, None)
+            return False
+        return True
+
+    @classmethod
+    def invalidate(cls, exam_id):
+        """
+        Drops the codes of the exam in all the processes, so they are
+        reloaded when needed.
+        """
+        cls._exams.pop(exam_id, None)
+        # a random version rather than a counter, which could repeat an
+        # old version after being evicted from the cache
+        cache.set(cls.VERSION_KEY.format(exam_id), uuid.uuid4().hex, None)
+
+    @classmethod
+    def _get_entry(cls, exam_id):
+        """
+        :return: expiry time of the entry, the version it was loaded at
+            and the codes with their expiry dates
+        :rtype: tuple[float, str | None, dict[str, datetime.datetime]]
+        """
+        version = cache.get(cls.VERSION_KEY.format(exam_id))
+        entry = cls._exams.get(exam_id)
+        if (entry is None or entry[0] < time.monotonic() or
+                entry[1] != version):
+            codes = {}
+            rows = (ExamCode.objects
+                            .filter(exam_id=exam_id)
+                            .filter(expiry_date__gt=timezone.now())
+                            .order_by('expiry_date')
+                            .values_list('code', 'expiry_date'))
+            # the latest expiry date wins if a code is repeated
+            for (code, expiry_date) in rows:
+                codes[code] = expiry_date
+            entry = (time.monotonic() + cls.TIMEOUT, version, codes)
+            cls._exams[exam_id] = entry
+        return entry
@@ -0,0 +1,148 @@
+import datetime
+
+from django.core.cache import cache
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from app.models import Exam, Group, GroupExamLink
+
+
+class UserExamList:
+    """
+    Upcoming and past exams of the user computed once and kept in the
+    cache. The lists are dropped by the signals whenever exams, exam
+    assignments or group members change, and the current date is a part
+    of the key, so the exams move to the past ones at midnight.
+    """
+
+    TIMEOUT = 24 * 60 * 60
+    KEY = 'exam_list:{}:{}'
+    PAGE_SIZE = 20  # number of past exams shown on a page
+
+    @classmethod
+    def get(cls, user_id):
+        """
+        :param int user_id: id of the user
+        :return: upcoming exams sorted by the closest due date, the first
+            page of past exams sorted by the latest due date and the
+            cursor of the next page; exams are dicts with id, name and
+            closest_due_date
+        :rtype: tuple[list[dict], list[dict], str | None]
+        """
+        today = timezone.now().date()
+        key = cls.KEY.format(user_id, today.isoformat())
+        lists = cache.get(key)
+        if lists is None:
+            lists = (
+                list(cls.upcoming_exams(user_id, today)),
+            ) + cls.get_old_exams(user_id)
+            cache.set(key, lists, cls.TIMEOUT)
+        return lists
+
+    @classmethod
+    def get_old_exams(cls, user_id, cursor=None):
+        """
+        Reads a page of past exams after the cursor. Pages are selected by
+        the due date and id of the last exam on the previous page rather
+        than by offset, so deep pages are as cheap as the first one.
+
+        :param int user_id: id of the user
+        :param cursor: cursor of the page returned with the previous page,
+            None for the first page
+        :type cursor: str | None
+        :return: past exams and the cursor of the next page, or None if
+            it is the last page
+        :rtype: tuple[list[dict], str | None]
+        :raise ValueError: if the cursor is malformed
+        """
+        old_exams = cls.old_exams(user_id, timezone.now().date())
+        if cursor is not None:
+            (due_date, exam_id) = cls.parse_cursor(cursor)
+            old_exams = old_exams.filter(
+                Q(closest_due_date__lt=due_date) |
+                Q(closest_due_date=due_date, id__lt=exam_id)
+            )
+        old_exams = list(old_exams[:cls.PAGE_SIZE + 1])
+        if len(old_exams) <= cls.PAGE_SIZE:
+            return (old_exams, None)
+        del old_exams[cls.PAGE_SIZE:]
+        last = old_exams[-1]
+        return (old_exams, '{}_{}'.format(
+            last['closest_due_date'].isoformat(), last['id']
+        ))
+
+    @staticmethod
+    def parse_cursor(cursor):
+        """
+        :param str cursor: cursor of the page, formatted as the due date
+            and the id of the last exam on the previous page
+        :return: due date and exam id
+        :rtype: tuple[datetime.date, int]
+        :raise ValueError: if the cursor is malformed
+        """
+        (due_date, exam_id) = cursor.split('_')
+        return (
+            datetime.datetime.strptime(due_date, '%Y-%m-%d').date(),
+            int(exam_id)
+        )
+
+    @staticmethod
+    def upcoming_exams(user_id, today):
+        """
+        :return: query of the exams due today or later
+        :rtype: django.db.models.QuerySet
+        """
+        return (Exam.objects
+                .filter(group__members__id=user_id)
+                .filter(groupexamlink__due_date__gte=today)
+                .annotate(closest_due_date=Min('groupexamlink__due_date'))
+                .order_by('closest_due_date')
+                .values('id', 'name', 'closest_due_date'))
+
+    @staticmethod
+    def old_exams(user_id, today):
+        """
+        :return: query of the exams which are no longer due
+        :rtype: django.db.models.QuerySet
+        """
+        return (Exam.objects
+                .filter(group__members__id=user_id)
+                .filter(groupexamlink__due_date__lt=today)
+                .annotate(closest_due_date=Max('groupexamlink__due_date'))
+                .exclude(groupexamlink__due_date__gte=today)
+                .order_by('-closest_due_date', '-id')
+                .values('id', 'name', 'closest_due_date'))
+
+    @classmethod
+    def invalidate(cls, user_ids):
+        """
+        :param user_ids: ids of the users whose lists are dropped
+        :type user_ids: collections.Iterable[int]
+        """
+        today = timezone.now().date().isoformat()
+        cache.delete_many([
+            cls.KEY.format(user_id, today) for user_id in user_ids
+        ])
+
+    @classmethod
+    def invalidate_groups(cls, group_ids):
+        """
+        :param group_ids: ids of the groups whose members' lists are dropped
+        :type group_ids: collections.Iterable[int]
+        """
+        cls.invalidate(
+            Group.members.through.objects
+                 .filter(group_id__in=list(group_ids))
+                 .values_list('user_id', flat=True)
+                 .distinct()
+        )
+
+    @classmethod
+    def invalidate_exam(cls, exam_id):
+        """
+        :param int exam_id: id of the exam whose students' lists are dropped
+        """
+        cls.invalidate_groups(
+            GroupExamLink.objects.filter(exam_id=exam_id)
+                                 .values_list('group_id', flat=True)
+        )
@@ -1,42 +1,147 @@
 import csv
-import random
-from collections import namedtuple
-
+import heapq
 import itertools
+import random
+import sys
+import time
+import uuid
+from bisect import bisect_left, bisect_right
+from collections import Counter, namedtuple
 
 import math
-from django.db import transaction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, router, transaction
 
-from app.models import Question, Exam
+from app.models import (AnswerChoice, AnswerRecord, Question, Exam,
+                        QuestionSet, UserX)
+
+try:
+    import numpy
+except ImportError:  # batch drawing falls back to the pure python sampler
+    numpy = None
 
 
 QuestionRawData = namedtuple(
     'QuestionRaw', ['text', 'type', 'rating', 'answers'])
 
+RatedQuestion = namedtuple('RatedQuestion', ['id', 'rating'])
+
+Grade = namedtuple('Grade', ['score', 'expected', 'rating_change'])
+
+_IndexEntry = namedtuple(
+    '_IndexEntry', ['expires', 'version', 'ratings', 'questions']
+)
+
+
+class ImportCancelled(Exception):
+    """Raised by the progress callback to stop saving the exam."""
+
 
 class ExamUploader:
     """
     Parses the uploaded file with the exam data and uploads it to the database.
     provided file should be a csv file with the following rows:
         question, type, rating, answer1, score1, answer2, score2, ...
+
+    Rows are streamed from the file, so it is never held in memory, and
+    saved with bulk inserts in chunks of ``chunk_size`` questions, each
+    chunk in its own transaction.
+
+    If an existing exam is given, the uploader updates it instead of
+    creating a new one: questions found in the file by their fingerprint
+    are left untouched, so they keep their ratings, and only the changed
+    questions are written. A changed row is a new question, rated as in
+    the file, and replaces a question missing from the file.
     """
-    def __init__(self, name, num_questions):
+
+    CHUNK_SIZE = 500  # number of questions saved in a single transaction
+    MAX_ERRORS = 20  # number of invalid rows reported
+
+    def __init__(self, name, num_questions, chunk_size=CHUNK_SIZE,
+                 exam=None):
         self._name = name
         self._num_questions = num_questions
-        self._data = None
+        self._chunk_size = chunk_size
+        self._exam = exam
+        self._file = None
+        self._has_headers = False
+        self._records = None
+        self._num_rows = 0
+        # list of line numbers and messages of the invalid rows
+        self.errors = []
+        self.error_count = 0
+
+    @property
+    def num_rows(self):
+        """Number of valid rows in the loaded file."""
+        return self._num_rows
 
     def load_csv(self, file, has_headers=False):
         """
-        Reads data rows from the specified file and validate them.
+        Binds the file to the uploader and validates its rows.
+        Invalid rows are reported in ``errors``. The file is read again
+        when the exam is saved, so it must be seekable.
         
         :param file: csv file containing exam data
         :param has_headers: whether the file has header row
-        :return: None
+        :return: whether all the rows are valid
+        :rtype: bool
+        """
+        self._file = file
+        self._has_headers = has_headers
+        self._records = None
+        self._num_rows = 0
+        self.errors = []
+        self.error_count = 0
+        line_no = 0
+        try:
+            for (line_no, row) in self._read_rows():
+                try:
+                    self._validate_row(row)
+                except (ValueError, IndexError) as e:
+                    self._add_error(line_no, e)
+                else:
+                    self._num_rows += 1
+        except (csv.Error, UnicodeDecodeError) as e:
+            self._add_error(line_no + 1, e)
+        return self.error_count == 0
+
+    def load_records(self, records, num_rows=None):
+        """
+        Binds rows which were already parsed and validated, e.g. in another
+        process, to the uploader. An iterator of rows can be read only once,
+        so it cannot be used to update an existing exam.
+
+        :param records: parsed rows
+        :type records: list[QuestionRawData] | collections.Iterator
+        :param int num_rows: number of rows, required if records is not
+            a list
+        """
+        self._file = None
+        self._records = records
+        self._num_rows = len(records) if num_rows is None else num_rows
+        self.errors = []
+        self.error_count = 0
+
+    def _read_rows(self):
+        """
+        Reads the bound file from the beginning.
+
+        :return: generator of line numbers and rows of values
+        :rtype: collections.Iterator[tuple[int, list[str]]]
         """
-        reader = csv.reader(file)
-        if has_headers:
-            next(reader)
-        self._data = [self._validate_row(row) for row in reader]
+        self._file.seek(0)
+        reader = csv.reader(self._file)
+        if self._has_headers:
+            next(reader, None)
+        for row in reader:
+            yield (reader.line_num, row)
+
+    def _add_error(self, line_no, error):
+        self.error_count += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append((line_no, str(error)))
 
     @staticmethod
     def _validate_row(row):
@@ -50,6 +155,8 @@ class ExamUploader:
         if q_type not in {c[0] for c in Question.TYPE_CHOICES}:
             raise ValueError("Invalid question type {}".format(q_type))
         answers = [(row[i], int(row[i + 1])) for i in range(3, len(row), 2)]
+        if len(answers) > Question.MAX_ANSWERS:
+            raise ValueError("Too many answers")
         return QuestionRawData(
             text=row[0],
             type=q_type,
@@ -57,28 +164,210 @@ class ExamUploader:
             answers=answers
         )
 
-    def save_to_db(self):
+    def save_to_db(self, progress=None):
         """
         Saves the uploaded exam file to the database.
+        A new exam is removed if any of the chunks fails to save or the
+        progress callback raises ``ImportCancelled``, an updated exam is
+        left unchanged.
         
-        :return: None
+        :param progress: function called with the number of saved rows
+            after each chunk
+        :type progress: (int) -> None
+        :return: the created or updated exam
+        :rtype: Exam
         """
-        if self._data is None:
+        if self._file is None and self._records is None:
             raise ValueError("File not uploaded")
-        if self._num_questions > len(self._data):
+        if self.error_count:
+            raise ValueError("File contains invalid rows")
+        if self._num_questions > self._num_rows:
             raise ValueError("Not enough questions")
+        if self._exam is not None:
+            self._update_exam(progress)
+            return self._exam
+        exam = Exam.objects.create(
+            name=self._name, num_questions=self._num_questions
+        )
+        try:
+            saved = 0
+            for chunk in self._read_chunks(self.read_records()):
+                with transaction.atomic():
+                    self._insert_questions(exam, chunk)
+                saved += len(chunk)
+                if progress is not None:
+                    progress(saved)
+        except BaseException:
+            exam.delete()
+            raise
+        return exam
+
+    def _update_exam(self, progress=None):
+        """
+        Updates questions of the bound exam to match the file.
+        Rows which fingerprints match the existing questions are skipped.
+        The other rows are inserted with the ratings from the file and the
+        questions missing from the file are deleted. Ratings of the removed
+        questions are not carried over, as there is no telling which new
+        row, if any, is their edited version.
+        The update is saved in a single transaction, so the exam is left
+        unchanged if it fails or the progress callback raises
+        ``ImportCancelled``.
+
+        :param progress: function called with the number of saved rows
+            after each chunk
+        :type progress: (int) -> None
+        """
+        exam = self._exam
+        new_counts = Counter(
+            self._get_fingerprint(record) for record in self.read_records()
+        )
+        removed_ids = []
+        existing = (exam.questions.order_by('id')
+                                  .values_list('id', 'fingerprint'))
+        for (question_id, fingerprint) in existing.iterator():
+            if new_counts[fingerprint] > 0:
+                new_counts[fingerprint] -= 1
+            else:
+                removed_ids.append(question_id)
+
+        def is_new(record):
+            fingerprint = self._get_fingerprint(record)
+            if new_counts[fingerprint] > 0:
+                new_counts[fingerprint] -= 1
+                return True
+            return False
+
+        saved = 0
+        new_records = filter(is_new, self.read_records())
         with transaction.atomic():
-            exam = Exam.objects.create(
-                name=self._name, num_questions=self._num_questions
+            for i in range(0, len(removed_ids), self._chunk_size):
+                self._delete_questions(removed_ids[i:i + self._chunk_size])
+            for chunk in self._read_chunks(new_records):
+                self._insert_questions(exam, chunk)
+                saved += len(chunk)
+                if progress is not None:
+                    progress(saved)
+            exam.name = self._name
+            exam.num_questions = self._num_questions
+            exam.save()
+            QuestionPool.invalidate(exam.id)
+        # once committed, so no process reloads the index from before
+        QuestionIndex.invalidate(exam.id)
+
+    def read_records(self):
+        """
+        :return: generator of parsed rows of the bound file
+        :rtype: collections.Iterator[QuestionRawData]
+        """
+        if self._records is not None:
+            return iter(self._records)
+        return (self._validate_row(row) for (_, row) in self._read_rows())
+
+    def _read_chunks(self, records):
+        """
+        :param records: parsed rows
+        :type records: collections.Iterable[QuestionRawData]
+        :return: generator of lists of at most ``chunk_size`` records
+        :rtype: collections.Iterator[list[QuestionRawData]]
+        """
+        records = iter(records)
+        while True:
+            chunk = list(itertools.islice(records, self._chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    @staticmethod
+    def _get_fingerprint(record):
+        return Question.get_fingerprint(
+            record.text, record.type, record.answers
+        )
+
+    def _insert_questions(self, exam, records):
+        """
+        Saves questions and their answers to the exam with bulk inserts.
+        Must be called inside a transaction.
+
+        :param Exam exam: exam the questions are added to
+        :param records: parsed questions
+        :type records: list[QuestionRawData]
+        """
+        questions = self._bulk_create_questions(exam, [
+            Question(
+                exam=exam, text=record.text, type=record.type,
+                rating=record.rating,
+                correct_mask=Question.get_correct_mask(
+                    ans[1] for ans in record.answers
+                ),
+                num_answers=len(record.answers),
+                fingerprint=self._get_fingerprint(record)
             )
-            for record in self._data:
-                question = exam.questions.create(
-                    text=record.text, type=record.type, rating=record.rating
-                )
-                for ans in record.answers:
-                    question.answers.create(
-                        text=ans[0], is_correct=ans[1]
-                    )
+            for record in records
+        ])
+        self._insert_answers(
+            (question.id, record) for (question, record)
+            in zip(questions, records)
+        )
+
+    @staticmethod
+    def _delete_questions(question_ids):
+        """
+        Deletes the questions with their answers using a query per table,
+        keeping the answer history of the students. Deletion signals are
+        not sent, so the caches of the exam must be invalidated afterwards.
+        Must be called inside a transaction.
+
+        :param question_ids: ids of the deleted questions
+        :type question_ids: list[int]
+        """
+        if not question_ids:
+            return
+        using = router.db_for_write(Question)
+        (AnswerRecord.objects.filter(question_id__in=question_ids)
+                             .update(question=None))
+        # the answer signals would update the summary of each question
+        (AnswerChoice.objects.filter(question_id__in=question_ids)
+                             ._raw_delete(using))
+        Question.objects.filter(id__in=question_ids)._raw_delete(using)
+
+    @staticmethod
+    def _insert_answers(questions):
+        """
+        :param questions: ids of the questions with their parsed content
+        :type questions: collections.Iterable[tuple[int, QuestionRawData]]
+        """
+        AnswerChoice.objects.bulk_create(
+            AnswerChoice(question_id=question_id, text=ans[0],
+                         is_correct=bool(ans[1]))
+            for (question_id, record) in questions
+            for ans in record.answers
+        )
+
+    @staticmethod
+    def _bulk_create_questions(exam, questions):
+        """
+        Inserts the questions and sets their ids. Must be called inside
+        a transaction.
+
+        :param Exam exam: exam the questions belong to
+        :param questions: new questions of the exam
+        :type questions: list[Question]
+        :return: the inserted questions
+        :rtype: list[Question]
+        """
+        questions = Question.objects.bulk_create(questions)
+        if questions and questions[0].pk is None:
+            # The database does not return the ids of inserted rows, but
+            # the ids of the rows inserted in the transaction are the last
+            # and ascending ones.
+            ids = list(Question.objects.filter(exam=exam)
+                                       .order_by('-id')
+                                       .values_list('id', flat=True)
+                                       [:len(questions)])
+            for (question, pk) in zip(questions, reversed(ids)):
+                question.pk = pk
+        return questions
 
 
 class RandomQuestion:
@@ -86,35 +375,81 @@ class RandomQuestion:
     TOLERANCE = 300  # score difference where weight drops by half
 
     @classmethod
-    def get_choices(cls, questions, num, peak, difficulty=None):
+    def get_choices(cls, questions, num, peak, difficulty=None, rng=None):
         """
-        Randomly draws ``num``questions from the iterable given in ``questions``
-        using the gaussian distribution centered at rating given in ``peak``
-        
+        Randomly draws ``num`` questions from the iterable given in
+        ``questions`` without replacement using the gaussian distribution
+        centered at rating given in ``peak``.
+
+        Every question gets a key ``log(E) - log(w)`` where ``E`` is
+        an exponential random variate and ``w`` the question weight, and
+        ``num`` questions with the smallest keys are picked. The result has
+        the same distribution as drawing the questions one by one with
+        probability proportional to their weights, but takes a single pass
+        over the questions. Weights are handled in the log space, so
+        questions far from the peak never underflow to zero.
+
         :param questions: list of questions with their ratings
-        :type questions: list[app.models.Question]
+        :type questions: collections.Iterable[app.models.Question]
         :param int num: number of questions to randomly draw
         :param int peak: location of weight peak (middle rating)
         :param None difficulty: additional customization of difficulty
-        :return: list of choices in the exam set
+        :param rng: random number generator, module level one if not given
+        :type rng: random.Random
+        :return: list of choices in the exam set in the order of drawing
         :rtype: list[Question]
         """
         if difficulty is not None:
             raise NotImplementedError('Difficulty is not implemented yet')
-        weights = cls.get_weights(questions, peak)
-        total_cumulative = sum(weights)
-        rand_questions = []
-        while len(rand_questions) < num:
-            rand = random.uniform(0, total_cumulative)
-            cumulative = 0
-            for (i, w) in zip(itertools.count(), weights):
-                cumulative += w
-                if cumulative > rand:
-                    rand_questions.append(questions[i])
-                    total_cumulative -= w
-                    weights[i] = 0
-                    break
-        return rand_questions
+        if rng is None:
+            rng = random
+        questions = list(questions)
+        keys = [
+            math.log(rng.expovariate(1) or sys.float_info.min) - log_weight
+            for log_weight in cls.get_log_weights(questions, peak)
+        ]
+        chosen = heapq.nsmallest(
+            num, range(len(questions)), key=keys.__getitem__
+        )
+        return [questions[i] for i in chosen]
+
+    @classmethod
+    def get_choices_batch(cls, questions, num, peaks, seed=None):
+        """
+        Draws a set of ``num`` questions for every rating given in ``peaks``
+        at once, e.g. for all students of a group. The question bank is read
+        only once and, if numpy is available, keys of all the sets are
+        computed in a single vectorised pass.
+
+        :param questions: list of questions with their ratings
+        :type questions: collections.Iterable[app.models.Question]
+        :param int num: number of questions in each set
+        :param peaks: ratings of the students the sets are drawn for
+        :type peaks: collections.Sequence[int]
+        :param int seed: seed of the random number generator
+        :return: list of question sets, one for each peak
+        :rtype: list[list[Question]]
+        """
+        questions = list(questions)
+        if numpy is None:
+            rng = random.Random(seed)
+            return [
+                cls.get_choices(questions, num, peak, rng=rng)
+                for peak in peaks
+            ]
+        num = min(num, len(questions))
+        if num == 0:
+            return [[] for _ in peaks]
+        ratings = numpy.array([q.rating for q in questions], dtype=float)
+        peaks = numpy.array(peaks, dtype=float).reshape(-1, 1)
+        log_weights = -((ratings - peaks) / cls.TOLERANCE) ** 2 * math.log(2)
+        rng = numpy.random.RandomState(seed)
+        exp = rng.exponential(size=log_weights.shape)
+        keys = numpy.log(numpy.maximum(exp, sys.float_info.min)) - log_weights
+        chosen = numpy.argpartition(keys, num - 1, axis=1)[:, :num]
+        order = numpy.take_along_axis(keys, chosen, axis=1).argsort(axis=1)
+        chosen = numpy.take_along_axis(chosen, order, axis=1)
+        return [[questions[i] for i in row] for row in chosen.tolist()]
 
     @classmethod
     def get_weights(cls, questions, peak):
@@ -132,6 +467,97 @@ class RandomQuestion:
             for q in questions
         ]
 
+    @classmethod
+    def get_log_weights(cls, questions, peak):
+        """
+        Calculates a natural logarithm of the weight of each question.
+
+        :param questions: list of questions
+        :type questions: collections.Iterable[app.models.Question]
+        :param int peak: rating for which the weight is max
+        :return: list of log-weights corresponding to questions
+        :rtype: list[float]
+        """
+        return [
+            -((q.rating - peak) / cls.TOLERANCE) ** 2 * math.log(2)
+            for q in questions
+        ]
+
+
+class QuestionIndex:
+    """
+    In-process index of question ratings of each exam sorted by rating.
+
+    Questions much further than ``RandomQuestion.TOLERANCE`` from the
+    student's rating have negligible weights, so only the questions within
+    a rating window around the student's rating are given to the sampler.
+    The index is reloaded after ``TIMEOUT`` seconds as question ratings
+    drift with every answer. Added or deleted questions are announced to
+    all the processes by a new version of the exam index in the shared
+    cache, so no process draws deleted questions from its stale index.
+    """
+
+    TIMEOUT = 300  # seconds after which the exam index is reloaded
+    VERSION_KEY = 'question_index_version:{}'
+
+    _exams = {}
+
+    @classmethod
+    def get_candidates(cls, exam_id, peak, num, window=None):
+        """
+        Finds questions of the exam which ratings are within ``window``
+        from ``peak``. The window is widened until it contains at least
+        ``num`` questions or covers the whole exam.
+
+        :param int exam_id: id of the exam the questions are drawn from
+        :param int peak: rating of the student
+        :param int num: minimum number of candidates
+        :param int window: initial distance from the peak, defaults to
+            the ``QUESTION_RATING_WINDOW`` setting
+        :return: list of questions ids with their ratings
+        :rtype: list[RatedQuestion]
+        """
+        if window is None:
+            window = settings.QUESTION_RATING_WINDOW
+        window = max(window, 1)
+        entry = cls._get_entry(exam_id)
+        while True:
+            lo = bisect_left(entry.ratings, peak - window)
+            hi = bisect_right(entry.ratings, peak + window)
+            if hi - lo >= num or (lo == 0 and hi == len(entry.ratings)):
+                return entry.questions[lo:hi]
+            window *= 2
+
+    @classmethod
+    def invalidate(cls, exam_id):
+        """
+        Drops the index of the exam in all the processes, so it is
+        reloaded on the next use.
+        """
+        cls._exams.pop(exam_id, None)
+        cache.set(cls.VERSION_KEY.format(exam_id), uuid.uuid4().hex, None)
+
+    @classmethod
+    def _get_entry(cls, exam_id):
+        version = cache.get(cls.VERSION_KEY.format(exam_id))
+        entry = cls._exams.get(exam_id)
+        if (entry is None or entry.expires < time.monotonic() or
+                entry.version != version):
+            questions = [
+                RatedQuestion(*row) for row in
+                Question.objects.filter(exam_id=exam_id)
+                                .order_by('rating')
+                                .values_list('id', 'rating')
+            ]
+            entry = _IndexEntry(
+                expires=time.monotonic() + cls.TIMEOUT,
+                version=version,
+                ratings=[q.rating for q in questions],
+                questions=questions
+            )
+            cls._exams[exam_id] = entry
+        return entry
+
 
 class AnswerScore:
 
@@ -140,46 +566,63 @@ class AnswerScore:
     MULTIPLIER = 100  # maximum rating change on a single question
 
     @classmethod
-    def get_rating_change(cls, question, answer_choices, answer,
-                          user_rating):
+    def get_rating_change(cls, question, answer_mask, user_rating):
         """
         :param question: question for which it calculated the score
-        :type question: Question
-        :param answer_choices: query set of answer choices to this question
-        :type answer_choices: 
-            django.db.models.query.QuerySet[app.models.AnswerChoice]
-        :param answer: id of list of ids of the answer given by the user
-        :type answer: int | list[int]
+        :type question: Question | app.attempts.QuestionSnapshot
+        :param int answer_mask: bitmask of the answers chosen by the user
         :param int user_rating: rating of the user who answered the question
         """
-        score = cls.get_score(question, answer_choices, answer)
-        expected = cls.get_expected_score(question, user_rating)
-        print('score:', score, 'expected:', expected)
-        return cls.MULTIPLIER * (score - expected)
+        [grade] = cls.grade_answers([question], [answer_mask], user_rating)
+        return grade.rating_change
+
+    @classmethod
+    def grade_answers(cls, questions, answer_masks, user_rating):
+        """
+        Grades the answers to a batch of questions in one call.
+        Expected scores of all the questions are calculated against the
+        user rating from before the batch.
+
+        :param questions: answered questions with their correct answer masks
+        :type questions:
+            list[Question] | list[app.attempts.QuestionSnapshot]
+        :param answer_masks: bitmasks of the answers chosen by the user in
+            the same order as questions
+        :type answer_masks: list[int]
+        :param int user_rating: rating of the user who answered the questions
+        :return: scores and rating changes of the user for each answer
+        :rtype: list[Grade]
+        """
+        expected_scores = cls.get_expected_scores(
+            [q.rating for q in questions], user_rating
+        )
+        grades = []
+        for (question, answer_mask, expected) in zip(
+                questions, answer_masks, expected_scores):
+            score = cls.get_score(question, answer_mask)
+            grades.append(Grade(
+                score=score, expected=expected,
+                rating_change=cls.MULTIPLIER * (score - expected)
+            ))
+        return grades
 
     @staticmethod
-    def get_score(question, answer_choices, answer):
-        """
-        :param Question question: answered question
-        :param answer_choices: query set of answer choices
-        :type answer_choices:
-            django.db.models.query.QuerySet[app.models.AnswerChoice]
-        :param answer: id or list of ids of the answer
-        :type answer: int | list[int]
+    def get_score(question, answer_mask):
+        """
+        :param question: answered question with its correct answers mask
+        :type question: Question | app.attempts.QuestionSnapshot
+        :param int answer_mask: bitmask of the answers chosen by the user
         :return: score obtained by the user for the answer
         :rtype: float
         """
-        correct_answers = answer_choices.filter(is_correct=True)
-        correct = {ans.id for ans in correct_answers}
-        print('correct: %r' % correct)
-        print('answer: %r' % answer)
+        correct_mask = question.correct_mask
         if question.type == Question.MULTIPLE_CHOICE:
-            extra = len(answer) - len(correct.intersection(answer))
-            missed = len(correct.difference(answer))
+            extra = bin(answer_mask & ~correct_mask).count('1')
+            missed = bin(correct_mask & ~answer_mask).count('1')
             score = 1 - (extra + missed) / 2
             return score if score >= 0 else 0
         elif question.type == Question.SINGLE_CHOICE:
-            return int(answer in correct)
+            return int(answer_mask & correct_mask != 0)
         else:
             raise AssertionError("Invalid question type '%s'" % question.type)
 
@@ -190,10 +633,203 @@ class AnswerScore:
         It compares relative user and question rating to determine the 
         expected result.
         
-        :param Question question: question for which score is calculated
+        :param question: question for which score is calculated
+        :type question: Question | app.attempts.QuestionSnapshot
         :param int user_rating: rating of the user
         """
+        [expected] = cls.get_expected_scores([question.rating], user_rating)
+        return expected
+
+    @classmethod
+    def get_expected_scores(cls, question_ratings, user_rating):
+        """
+        Calculates expected scores of the user for a batch of questions.
+
+        :param question_ratings: ratings of the questions
+        :type question_ratings: list[int]
+        :param int user_rating: rating of the user
+        :return: expected scores in the same order as question ratings
+        :rtype: list[float]
+        """
         a = cls.ZERO_SCORE / (1 - cls.ZERO_SCORE)
-        diff = question.rating - user_rating
-        expected = a / (a + math.exp(diff / cls.SPAN))
-        return round(expected, 3)
+        return [
+            round(a / (a + math.exp((rating - user_rating) / cls.SPAN)), 3)
+            for rating in question_ratings
+        ]
+
+
+class QuestionSetGenerator:
+    """
+    Draws question sets in advance, so that students starting the exam
+    do not have to wait for the questions to be drawn.
+    """
+
+    @staticmethod
+    def pregenerate(group_exam_link, seed=None):
+        """
+        Draws question sets of the linked exam for all the members of the
+        linked group in a single batch and replaces their unused sets.
+
+        :param GroupExamLink group_exam_link: exam assignment to the group
+        :param int seed: seed of the random number generator
+        :return: number of generated sets
+        :rtype: int
+        """
+        exam = group_exam_link.exam
+        students = list(
+            UserX.objects.filter(user__group=group_exam_link.group_id)
+                         .values_list('user_id', 'rating')
+        )
+        question_sets = RandomQuestion.get_choices_batch(
+            questions=exam.questions.only('id', 'rating'),
+            num=exam.num_questions,
+            peaks=[rating for (_, rating) in students],
+            seed=seed
+        )
+        with transaction.atomic():
+            (QuestionSet.objects
+                        .filter(exam=exam)
+                        .filter(user_id__in=[uid for (uid, _) in students])
+                        .delete())
+            QuestionSet.objects.bulk_create(
+                QuestionSet(
+                    exam=exam, user_id=user_id,
+                    question_ids=QuestionSet.join_ids(q.id for q in questions)
+                )
+                for ((user_id, _), questions) in zip(students, question_sets)
+            )
+        return len(students)
+
+    @staticmethod
+    def pop(exam, user):
+        """
+        Takes the question set prepared for the user out of the database.
+
+        :param Exam exam: exam the user is starting
+        :param User user: user starting the exam
+        :return: ids of the questions or None if no set was prepared
+        :rtype: list[int] | None
+        """
+        # read from the primary database, as the set is deleted right away
+        question_set = (QuestionSet.objects
+                                   .using(router.db_for_write(QuestionSet))
+                                   .filter(exam=exam, user=user)
+                                   .order_by('id')
+                                   .first())
+        if question_set is None:
+            return None
+        question_set.delete()
+        return question_set.split_ids()
+
+
+class QuestionPool:
+    """
+    Pool of question sets drawn in advance for each exam and rating band.
+
+    Students starting the exam take a ready set drawn for the band of their
+    rating, while ``refill`` keeps the pool topped up in the background.
+    Numbers of successful and failed pops are counted in the cache. The
+    counts are approximate: the file based cache increments a counter by
+    reading and writing it again, which loses concurrent increments, and
+    counters may be evicted.
+    """
+
+    BAND_WIDTH = 100  # rating span of a single band
+    HITS_KEY = 'question_pool:hits'
+    MISSES_KEY = 'question_pool:misses'
+
+    @classmethod
+    def get_band(cls, rating):
+        """Returns the band the rating belongs to."""
+        return (rating + cls.BAND_WIDTH // 2) // cls.BAND_WIDTH
+
+    @classmethod
+    def pop(cls, exam, rating):
+        """
+        Takes a question set of the rating band out of the pool.
+
+        :param Exam exam: exam the user is starting
+        :param int rating: rating of the user
+        :return: ids of the questions or None if the pool is empty
+        :rtype: list[int] | None
+        """
+        candidates = (QuestionSet.objects
+                                 .using(router.db_for_write(QuestionSet))
+                                 .filter(exam=exam, band=cls.get_band(rating))
+                                 .filter(user=None)
+                                 .values_list('id', 'question_ids')[:3])
+        for (set_id, question_ids) in candidates:
+            # the set might have been taken by a concurrent request
+            if QuestionSet.objects.filter(id=set_id).delete()[0]:
+                cls._count(cls.HITS_KEY)
+                return QuestionSet(question_ids=question_ids).split_ids()
+        cls._count(cls.MISSES_KEY)
+        return None
+
+    @classmethod
+    def refill(cls, exam, bands, size):
+        """
+        Draws missing question sets, so that each of the bands has ``size``
+        sets in the pool.
+
+        :param Exam exam: exam which pool is refilled
+        :param bands: rating bands to refill
+        :type bands: collections.Iterable[int]
+        :param int size: number of sets kept for each band
+        :return: number of new sets
+        :rtype: int
+        """
+        bands = set(bands)
+        counts = dict(
+            QuestionSet.objects.filter(exam=exam, user=None, band__in=bands)
+                               .values_list('band')
+                               .annotate(models.Count('id'))
+        )
+        missing = [
+            band for band in bands
+            for _ in range(size - counts.get(band, 0))
+        ]
+        if not missing:
+            return 0
+        question_sets = RandomQuestion.get_choices_batch(
+            questions=exam.questions.only('id', 'rating'),
+            num=exam.num_questions,
+            peaks=[band * cls.BAND_WIDTH for band in missing]
+        )
+        QuestionSet.objects.bulk_create(
+            QuestionSet(
+                exam=exam, band=band,
+                question_ids=QuestionSet.join_ids(q.id for q in questions)
+            )
+            for (band, questions) in zip(missing, question_sets)
+        )
+        return len(missing)
+
+    @staticmethod
+    def invalidate(exam_id):
+        """
+        Drops all the question sets of the exam, both pooled and prepared
+        for the students, as they no longer match the questions. Prepared
+        sets are drawn again by the ``pregenerate_question_sets`` command.
+        """
+        QuestionSet.objects.filter(exam_id=exam_id).delete()
+
+    @classmethod
+    def get_stats(cls):
+        """
+        :return: number of sets taken from the pool and of empty pool hits
+        :rtype: dict[str, int]
+        """
+        return {
+            'hits': cache.get(cls.HITS_KEY, 0),
+            'misses': cache.get(cls.MISSES_KEY, 0)
+        }
+
+    @staticmethod
+    def _count(key):
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # the counter has just been evicted
+            pass
@@ -3,7 +3,8 @@ import re
 from django import forms
 from django.contrib.auth.models import User
 
-from app.models import ExamCode, RegistrationCode, Question
+from app.exam_codes import ExamCodeCache
+from app.models import Exam, RegistrationCode, Question
 
 
 # Account creation and management forms
@@ -196,10 +197,41 @@ class UploadExamFileForm(forms.Form):
         required=False,
         help_text='The file has headers row'
     )
+    exam = forms.ModelChoiceField(
+        queryset=Exam.objects.all(),
+        required=False,
+        label='Update exam',
+        help_text='Update questions of this exam instead of creating a new '
+                  'one. Ratings of unchanged questions are kept, changed '
+                  'questions get the ratings from the file.'
+    )
     # TODO Parse file in the cleaning section.
     # TODO Add file validation (eg. json-schema) here.
 
 
+class AnswerChoiceFormSet(forms.BaseInlineFormSet):
+    """
+    Answer choices of a question edited in the admin. A question can have
+    at most ``Question.MAX_ANSWERS`` answers, which fit in its correct
+    answers mask.
+    """
+
+    def clean(self):
+        super().clean()
+        if any(self.errors):
+            return
+        answers = [
+            form for form in self.forms
+            if form.cleaned_data and not self._should_delete_form(form)
+        ]
+        if len(answers) > Question.MAX_ANSWERS:
+            raise forms.ValidationError(
+                'A question can have at most %(max)d answers.',
+                code='too_many_answers',
+                params={'max': Question.MAX_ANSWERS}
+            )
+
+
 class ExamCodeForm(forms.Form):
     code = forms.CharField(
         label='Kod',
@@ -223,17 +255,14 @@ class ExamCodeForm(forms.Form):
 
     def clean_code(self):
         """
-        Checks if the code for the previously bound exam id is present in the
-        database. Raises form validation error if not.
+        Checks if the code for the previously bound exam id exists and has
+        not expired. Raises form validation error if not.
         :return: cleaned code
         """
         code = self.cleaned_data.get('code')
         if self._exam_id is None:
             raise RuntimeError('Exam not bound')
-        valid = (ExamCode.objects.filter(code=code)
-                                 .filter(exam_id=self._exam_id)
-                                 .exists())
-        if not valid:
+        if not ExamCodeCache.is_valid(self._exam_id, code):
             raise forms.ValidationError(
                 'Nieprawidłowy kod',
                 code='incorrect_code'
@@ -0,0 +1,162 @@
+import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+
+from app.exam_tools import ExamUploader, ImportCancelled
+from app.models import ImportJob
+
+
+class ImportJobRunner:
+    """
+    Runs the exam imports queued in the ``ImportJob`` table.
+    It is meant to be run in a separate worker process by the
+    ``run_import_worker`` command, so that the admin upload requests only
+    store the file.
+
+    The worker reports progress of the running job after each saved chunk.
+    A running job which has not reported progress for ``STALE_TIMEOUT``
+    seconds is assumed to be left by a stopped worker and is marked as
+    failed before the next job is claimed. It is not run again, as the
+    questions saved before the worker stopped are kept.
+    """
+
+    STALE_TIMEOUT = 600  # seconds without progress of a running job
+
+    @classmethod
+    def run_pending(cls):
+        """
+        Runs all the pending jobs in the order they were created.
+
+        :return: number of jobs run
+        :rtype: int
+        """
+        count = 0
+        while True:
+            job = cls._claim_next()
+            if job is None:
+                return count
+            cls.run(job)
+            count += 1
+
+    @classmethod
+    def _claim_next(cls):
+        """
+        Marks the oldest pending job as running, so that no other worker
+        picks it up. Stale running jobs are failed first.
+
+        :return: claimed job or None if there are no pending jobs
+        :rtype: ImportJob | None
+        """
+        cls._fail_stale()
+        while True:
+            job = (ImportJob.objects.filter(status=ImportJob.PENDING)
+                                    .order_by('id')
+                                    .first())
+            if job is None:
+                return None
+            now = timezone.now()
+            claimed = (ImportJob.objects
+                                .filter(id=job.id, status=ImportJob.PENDING)
+                                .update(status=ImportJob.RUNNING,
+                                        heartbeat_date=now))
+            if claimed:
+                job.status = ImportJob.RUNNING
+                job.heartbeat_date = now
+                return job
+
+    @classmethod
+    def _fail_stale(cls):
+        """
+        Marks the running jobs which stopped reporting progress as failed.
+
+        :return: number of failed jobs
+        :rtype: int
+        """
+        deadline = timezone.now() - datetime.timedelta(
+            seconds=cls.STALE_TIMEOUT
+        )
+        stale = (ImportJob.objects
+                          .filter(status=ImportJob.RUNNING)
+                          .filter(Q(heartbeat_date__lt=deadline) |
+                                  Q(heartbeat_date=None)))
+        count = 0
+        for job in stale:
+            # unless the worker reported progress in the meantime
+            failed = (ImportJob.objects
+                               .filter(id=job.id, status=ImportJob.RUNNING,
+                                       heartbeat_date=job.heartbeat_date)
+                               .update(status=ImportJob.FAILED,
+                                       message='The import worker stopped'))
+            if failed:
+                job.file.delete(save=False)
+                job.save(update_fields=['file'])
+                count += 1
+        return count
+
+    @staticmethod
+    def run(job):
+        """
+        Validates the job file and saves the exam, reporting the progress
+        in the job row. Stops when the cancellation of the job is requested.
+
+        :param ImportJob job: job marked as running
+        """
+        def progress(saved_rows):
+            job.saved_rows = saved_rows
+            ImportJob.objects.filter(id=job.id).update(
+                saved_rows=saved_rows, heartbeat_date=timezone.now()
+            )
+            if ImportJob.objects.filter(id=job.id,
+                                        cancel_requested=True).exists():
+                raise ImportCancelled()
+
+        uploader = ExamUploader(
+            job.exam_name, job.num_questions, exam=job.exam
+        )
+        try:
+            with open(job.file.path, encoding='utf8', newline='') as file:
+                if uploader.load_csv(file, job.has_headers):
+                    job.total_rows = uploader.num_rows
+                    ImportJob.objects.filter(id=job.id).update(
+                        total_rows=job.total_rows,
+                        heartbeat_date=timezone.now()
+                    )
+                    job.exam = uploader.save_to_db(progress)
+                    job.saved_rows = job.total_rows
+                    job.status = ImportJob.DONE
+                else:
+                    job.message = '\n'.join(
+                        'Line {}: {}'.format(line_no, message)
+                        for (line_no, message) in uploader.errors
+                    )
+                    job.status = ImportJob.FAILED
+        except ImportCancelled:
+            job.status = ImportJob.CANCELLED
+        except Exception as e:
+            job.message = str(e)
+            job.status = ImportJob.FAILED
+        finally:
+            job.file.delete(save=False)
+            job.save(update_fields=[
+                'file', 'status', 'total_rows', 'saved_rows', 'message',
+                'exam'
+            ])
+
+    @staticmethod
+    def cancel(job_id):
+        """
+        Cancels a pending job or requests the running job to stop.
+
+        :param int job_id: id of the job
+        """
+        cancelled = (ImportJob.objects
+                              .filter(id=job_id, status=ImportJob.PENDING)
+                              .update(status=ImportJob.CANCELLED))
+        if cancelled:
+            job = ImportJob.objects.get(id=job_id)
+            job.file.delete(save=False)
+            job.save(update_fields=['file'])
+        else:
+            (ImportJob.objects.filter(id=job_id, status=ImportJob.RUNNING)
+                              .update(cancel_requested=True))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.exam_bank import ExamBankWriter, open_bank_file
+from app.models import Exam
+
+
+class Command(BaseCommand):
+    help = ('Exports exams with their questions, answers and ratings to an '
+            'exam bank file, compressed with gzip if the name ends with .gz')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='output file')
+        parser.add_argument(
+            'exam_ids', nargs='*', type=int,
+            help='ids of the exported exams, all exams if not given'
+        )
+
+    def handle(self, *args, **options):
+        exams = Exam.objects.order_by('id')
+        if options['exam_ids']:
+            exams = exams.filter(id__in=options['exam_ids'])
+            missing = set(options['exam_ids']) - {e.id for e in exams}
+            if missing:
+                raise CommandError('Exams not found: {}'.format(
+                    ', '.join(str(exam_id) for exam_id in sorted(missing))
+                ))
+        num_rows = 0
+        with open_bank_file(options['path'], 'w') as file:
+            writer = ExamBankWriter(file)
+            for exam in exams.iterator():
+                num_rows += writer.write_exam(exam)
+                self.stdout.write('Exported {}'.format(exam.name))
+        self.stdout.write('Exported {} questions'.format(num_rows))
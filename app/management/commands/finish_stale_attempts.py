@@ -0,0 +1,42 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.attempts import AttemptSnapshot
+from app.models import ExamAttempt
+
+
+class Command(BaseCommand):
+    help = ('Finishes the exam attempts abandoned by the students, saving '
+            'the result of the answers given so far.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--age', type=int, default=AttemptSnapshot.TIMEOUT,
+            help='seconds after the start the attempt is considered stale'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='keep finishing the stale attempts every INTERVAL seconds'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.finish(options['age'])
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
+
+    def finish(self, age):
+        started_before = timezone.now() - timedelta(seconds=age)
+        attempts = ExamAttempt.objects.filter(
+            start_date__lt=started_before, finish_date=None
+        )
+        # the snapshots go first, so no answer is added after the finish
+        for attempt_id in attempts.values_list('attempt_id', flat=True):
+            AttemptSnapshot.discard(attempt_id)
+        count = AttemptSnapshot.finish_attempts(attempts)
+        if count:
+            self.stdout.write('Finished {} attempts'.format(count))
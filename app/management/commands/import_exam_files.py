@@ -0,0 +1,121 @@
+import glob
+import multiprocessing
+import os
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from app.exam_tools import ExamUploader, QuestionRawData
+
+
+def parse_file(path, has_headers):
+    """
+    Parses and validates the exam file in a worker process.
+
+    :return: path, parsed rows as plain tuples and validation errors
+    :rtype: tuple[str, list[tuple], list[tuple[int, str]]]
+    """
+    uploader = ExamUploader(None, 0)
+    try:
+        with open(path, encoding='utf8', newline='') as file:
+            if not uploader.load_csv(file, has_headers):
+                return (path, None, uploader.errors)
+            records = [tuple(record) for record in uploader.read_records()]
+    except OSError as e:
+        return (path, None, [(None, str(e))])
+    return (path, records, [])
+
+
+def _parse_file(args):
+    return parse_file(*args)
+
+
+class Command(BaseCommand):
+    help = ('Imports exam files from directories or glob patterns. Files are '
+            'parsed in a pool of processes and saved by a single writer.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='+',
+            help='csv files, directories or glob patterns'
+        )
+        parser.add_argument(
+            '--num-questions', type=int, default=20,
+            help='number of questions in each exam'
+        )
+        parser.add_argument(
+            '--has-headers', action='store_true',
+            help='the files have headers rows'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='number of parsing processes'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=ExamUploader.CHUNK_SIZE,
+            help='number of questions saved in a single transaction'
+        )
+
+    def handle(self, *args, **options):
+        paths = self.find_files(options['paths'])
+        if not paths:
+            raise CommandError('No files found')
+        started = time.monotonic()
+        num_rows = 0
+        failures = {}
+        with multiprocessing.Pool(options['workers'],
+                                  initializer=django.setup) as pool:
+            parsed = pool.imap_unordered(
+                _parse_file,
+                [(path, options['has_headers']) for path in paths]
+            )
+            for (path, records, errors) in parsed:
+                if records is None:
+                    failures[path] = errors
+                    continue
+                name = os.path.splitext(os.path.basename(path))[0]
+                uploader = ExamUploader(
+                    name[:30], options['num_questions'],
+                    chunk_size=options['chunk_size']
+                )
+                uploader.load_records(
+                    [QuestionRawData(*record) for record in records]
+                )
+                try:
+                    uploader.save_to_db()
+                except ValueError as e:
+                    failures[path] = [(None, str(e))]
+                else:
+                    num_rows += len(records)
+                    self.stdout.write('Imported {}'.format(path))
+        elapsed = time.monotonic() - started
+        for (path, errors) in sorted(failures.items()):
+            self.stderr.write('Failed {}:'.format(path))
+            for (line_no, message) in errors:
+                if line_no is None:
+                    self.stderr.write('  {}'.format(message))
+                else:
+                    self.stderr.write(
+                        '  line {}: {}'.format(line_no, message)
+                    )
+        self.stdout.write(
+            'Imported {} of {} files, {} rows in {:.1f}s ({:.0f} rows/s)'
+            .format(len(paths) - len(failures), len(paths), num_rows,
+                    elapsed, num_rows / elapsed if elapsed else 0)
+        )
+
+    @staticmethod
+    def find_files(patterns):
+        """
+        :param patterns: file paths, directories or glob patterns
+        :type patterns: list[str]
+        :return: sorted paths of the csv files
+        :rtype: list[str]
+        """
+        paths = set()
+        for pattern in patterns:
+            if os.path.isdir(pattern):
+                pattern = os.path.join(pattern, '*.csv')
+            paths.update(p for p in glob.glob(pattern) if os.path.isfile(p))
+        return sorted(paths)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.exam_bank import ExamBankReader, open_bank_file
+from app.exam_tools import ExamUploader
+
+
+class Command(BaseCommand):
+    help = ('Imports exams from an exam bank file written by export_exams '
+            'as new exams')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='input file')
+        parser.add_argument(
+            '--chunk-size', type=int, default=ExamUploader.CHUNK_SIZE,
+            help='number of questions saved in a single transaction'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open_bank_file(options['path'], 'r') as file:
+                reader = ExamBankReader(file)
+                exams = reader.import_exams(options['chunk_size'])
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(str(e))
+        for exam in exams:
+            self.stdout.write('Imported {} (id {})'.format(exam.name, exam.id))
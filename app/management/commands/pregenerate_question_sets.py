@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.exam_tools import QuestionSetGenerator
+from app.models import GroupExamLink
+
+
+class Command(BaseCommand):
+    help = ('Draws question sets in advance for every member of the group '
+            'the exam is assigned to.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'link_ids', nargs='+', type=int,
+            help='ids of the group-exam assignments'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=None,
+            help='seed of the random number generator'
+        )
+
+    def handle(self, *args, **options):
+        links = (GroupExamLink.objects
+                              .select_related('exam', 'group')
+                              .in_bulk(options['link_ids']))
+        missing = set(options['link_ids']).difference(links)
+        if missing:
+            raise CommandError(
+                'Group-exam links not found: {}'.format(sorted(missing))
+            )
+        for link_id in options['link_ids']:
+            link = links[link_id]
+            count = QuestionSetGenerator.pregenerate(link, options['seed'])
+            self.stdout.write(
+                'Generated {} question sets of {} for group {}'.format(
+                    count, link.exam, link.group
+                )
+            )
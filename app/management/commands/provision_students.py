@@ -0,0 +1,189 @@
+import csv
+import multiprocessing
+import os
+import re
+import string
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.crypto import get_random_string
+
+from app.forms import LoginForm
+from app.models import RegistrationCode, UserX
+
+# letters and digits which cannot be confused with each other
+CODE_CHARS = ''.join(
+    c for c in string.ascii_uppercase + string.digits if c not in 'O0I1'
+)
+# number of values in a single IN lookup, within the sqlite limit
+LOOKUP_SIZE = 500
+# longer usernames could not be entered in the login form
+USERNAME_LENGTH = LoginForm.base_fields['username'].max_length
+
+
+def lookup_in(queryset, field, values, *fields):
+    """
+    Reads the rows with the field matching any of the values in batches.
+
+    :return: values of the fields of the matching rows
+    :rtype: list[tuple]
+    """
+    values = list(values)
+    rows = []
+    for i in range(0, len(values), LOOKUP_SIZE):
+        rows.extend(queryset.filter(**{
+            field + '__in': values[i:i + LOOKUP_SIZE]
+        }).values_list(*fields))
+    return rows
+
+
+class Command(BaseCommand):
+    help = ('Generates registration codes in bulk or creates the accounts '
+            'of the students listed in a roster file. The roster is a csv '
+            'file with username and password columns; missing passwords '
+            'are generated. Created codes, usernames and generated '
+            'passwords are written as csv to the standard output.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--codes', type=int, default=0,
+            help='number of registration codes to generate'
+        )
+        parser.add_argument(
+            '--roster',
+            help='csv file with the students whose accounts are created'
+        )
+        parser.add_argument(
+            '--code-length', type=int, default=8,
+            help='number of characters of the generated codes'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='number of password hashing processes'
+        )
+
+    def handle(self, *args, **options):
+        if not options['codes'] and not options['roster']:
+            raise CommandError('Give the number of codes or a roster file')
+        if not 4 <= options['code_length'] <= 16:
+            raise CommandError('Code length must be between 4 and 16')
+        writer = csv.writer(self.stdout)
+        if options['codes']:
+            codes = self.generate_codes(
+                options['codes'], options['code_length']
+            )
+            RegistrationCode.objects.bulk_create(
+                RegistrationCode(code=code) for code in codes
+            )
+            for code in codes:
+                writer.writerow([code])
+        if options['roster']:
+            students = self.read_roster(options['roster'])
+            created = self.create_students(
+                students, options['code_length'], options['workers']
+            )
+            for row in created:
+                writer.writerow(row)
+            self.stderr.write('Created {} accounts'.format(len(created)))
+
+    @staticmethod
+    def read_roster(path):
+        """
+        :param str path: path to the roster file
+        :return: usernames and passwords, None if the password is missing
+        :rtype: list[tuple[str, str | None]]
+        :raise CommandError: if the roster is invalid or lists existing users
+        """
+        students = []
+        try:
+            with open(path, encoding='utf8', newline='') as file:
+                for (line_no, row) in enumerate(csv.reader(file), 1):
+                    if not row or not row[0].strip():
+                        continue
+                    username = row[0].strip()
+                    password = row[1] if len(row) > 1 and row[1] else None
+                    if (len(username) > USERNAME_LENGTH or
+                            re.search(r'[^\w@.\-]', username)):
+                        raise CommandError('Line {}: invalid username {}'
+                                           .format(line_no, username))
+                    students.append((username, password))
+        except OSError as e:
+            raise CommandError(str(e))
+        usernames = [username for (username, _) in students]
+        if len(set(usernames)) < len(usernames):
+            raise CommandError('Repeated usernames in the roster')
+        existing = lookup_in(User.objects, 'username', usernames, 'username')
+        if existing:
+            raise CommandError('Users already exist: {}'.format(
+                ', '.join(username for (username,) in existing)
+            ))
+        return students
+
+    @classmethod
+    def create_students(cls, students, code_length, workers):
+        """
+        Creates users with their profiles. Passwords are hashed in a pool
+        of processes and the rows are inserted in bulk.
+
+        :param students: usernames and passwords
+        :type students: list[tuple[str, str | None]]
+        :param int code_length: number of characters of the student codes
+        :param int workers: number of hashing processes
+        :return: username, student code and the generated password (empty
+            if it was given in the roster) of each student
+        :rtype: list[tuple[str, str, str]]
+        """
+        generated = [
+            get_random_string(10) if password is None else ''
+            for (_, password) in students
+        ]
+        passwords = [
+            password or new_password
+            for ((_, password), new_password) in zip(students, generated)
+        ]
+        with multiprocessing.Pool(workers, initializer=django.setup) as pool:
+            hashes = pool.map(make_password, passwords, chunksize=64)
+        codes = cls.generate_codes(len(students), code_length)
+        with transaction.atomic():
+            User.objects.bulk_create(
+                User(username=username, password=password_hash)
+                for ((username, _), password_hash) in zip(students, hashes)
+            )
+            user_ids = dict(lookup_in(
+                User.objects, 'username', (s[0] for s in students),
+                'username', 'id'
+            ))
+            UserX.objects.bulk_create(
+                UserX(user_id=user_ids[username], code=code)
+                for ((username, _), code) in zip(students, codes)
+            )
+        return [
+            (username, code, password)
+            for ((username, _), code, password)
+            in zip(students, codes, generated)
+        ]
+
+    @staticmethod
+    def generate_codes(num, length):
+        """
+        :param int num: number of codes
+        :param int length: number of characters of each code
+        :return: random codes not used by any registration code or student
+        :rtype: list[str]
+        """
+        codes = set()
+        while len(codes) < num:
+            batch = {
+                get_random_string(length, CODE_CHARS)
+                for _ in range(num - len(codes))
+            }
+            for model in (RegistrationCode, UserX):
+                batch.difference_update(
+                    code for (code,)
+                    in lookup_in(model.objects, 'code', batch, 'code')
+                )
+            codes |= batch
+        return sorted(codes)
@@ -0,0 +1,51 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.exam_tools import QuestionPool
+from app.models import Exam, UserX
+
+
+class Command(BaseCommand):
+    help = ('Tops up the pools of question sets of the exams which have '
+            'active codes, for the rating bands of the assigned students.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', type=int, default=settings.QUESTION_POOL_SIZE,
+            help='number of sets kept for each rating band'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='keep refilling the pools every INTERVAL seconds'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.refill(options['size'])
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
+
+    def refill(self, size):
+        exams = (Exam.objects
+                     .filter(examcode__expiry_date__gt=timezone.now())
+                     .distinct())
+        for exam in exams:
+            ratings = (UserX.objects
+                            .filter(user__group__exams=exam)
+                            .values_list('rating', flat=True)
+                            .distinct())
+            bands = {QuestionPool.get_band(rating) for rating in ratings}
+            count = QuestionPool.refill(exam, bands, size)
+            if count:
+                self.stdout.write(
+                    'Drew {} question sets for {}'.format(count, exam)
+                )
+        self.stdout.write(
+            'Pool hits: {hits}, misses: {misses}'.format(
+                **QuestionPool.get_stats()
+            )
+        )
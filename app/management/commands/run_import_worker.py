@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.jobs import ImportJobRunner
+
+
+class Command(BaseCommand):
+    help = 'Runs the queued exam file imports.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=2,
+            help='seconds between checks for new jobs'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='run the pending jobs and exit'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            count = ImportJobRunner.run_pending()
+            if count:
+                self.stdout.write('Ran {} import jobs'.format(count))
+            if options['once']:
+                break
+            time.sleep(options['interval'])
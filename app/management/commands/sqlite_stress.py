@@ -0,0 +1,112 @@
+import multiprocessing
+import random
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+
+TABLE = 'app_stress_test'
+
+
+def run_worker(duration, write_ratio, num_rows):
+    """
+    Runs short read and write transactions on the stress table until the
+    time is up.
+
+    :return: numbers of reads, writes and "database is locked" errors
+    :rtype: tuple[int, int, int]
+    """
+    reads = writes = errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        try:
+            if random.random() < write_ratio:
+                row_id = random.randrange(num_rows)
+                # reads before writing, like saving a model instance
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT value FROM {} WHERE id = %s'.format(TABLE),
+                        [row_id]
+                    )
+                    value = cursor.fetchone()[0]
+                    cursor.execute(
+                        'UPDATE {} SET value = %s WHERE id = %s'
+                        .format(TABLE), [value + 1, row_id]
+                    )
+                writes += 1
+            else:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT SUM(value) FROM {}'.format(TABLE))
+                    cursor.fetchone()
+                reads += 1
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            errors += 1
+    connection.close()
+    return (reads, writes, errors)
+
+
+def _run_worker(args):
+    return run_worker(*args)
+
+
+class Command(BaseCommand):
+    help = ('Runs concurrent reads and writes on a scratch table of the '
+            'sqlite database from several processes and reports the '
+            '"database is locked" errors. Compare the default and the '
+            'production settings to check the database configuration.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='number of concurrent processes'
+        )
+        parser.add_argument(
+            '--duration', type=float, default=5,
+            help='seconds each process runs for'
+        )
+        parser.add_argument(
+            '--write-ratio', type=float, default=0.2,
+            help='fraction of the transactions which write'
+        )
+        parser.add_argument(
+            '--rows', type=int, default=100,
+            help='number of rows of the scratch table'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The stress test runs on sqlite only')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.stdout.write('Journal mode: {}'.format(cursor.fetchone()[0]))
+            cursor.execute('DROP TABLE IF EXISTS {}'.format(TABLE))
+            cursor.execute(
+                'CREATE TABLE {} (id INTEGER PRIMARY KEY, value INTEGER)'
+                .format(TABLE)
+            )
+            cursor.executemany(
+                'INSERT INTO {} (id, value) VALUES (%s, 0)'.format(TABLE),
+                [(i,) for i in range(options['rows'])]
+            )
+        # the worker processes must not share the connection
+        connections.close_all()
+        try:
+            with multiprocessing.Pool(options['workers'],
+                                      initializer=django.setup) as pool:
+                results = pool.map(_run_worker, [
+                    (options['duration'], options['write_ratio'],
+                     options['rows'])
+                ] * options['workers'])
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('DROP TABLE IF EXISTS {}'.format(TABLE))
+        (reads, writes, errors) = (sum(r) for r in zip(*results))
+        self.stdout.write(
+            '{} reads, {} writes, {} "database is locked" errors '
+            'in {:.1f}s'.format(reads, writes, errors, options['duration'])
+        )
+        if errors:
+            raise CommandError('Database was locked {} times'.format(errors))
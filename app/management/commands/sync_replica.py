@@ -0,0 +1,69 @@
+import os
+import shutil
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+# the backup API of sqlite3 is available since Python 3.7
+HAS_BACKUP = hasattr(sqlite3.Connection, 'backup')
+
+
+class Command(BaseCommand):
+    help = ('Copies the default sqlite database to the sqlite replicas '
+            'listed in the DATABASE_REPLICAS setting. Stands in for the '
+            'replication when the replicas are tried locally.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='keep copying the database every INTERVAL seconds'
+        )
+
+    def handle(self, *args, **options):
+        aliases = ['default'] + settings.DATABASE_REPLICAS
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('No replicas configured')
+        if any(connections[alias].vendor != 'sqlite' for alias in aliases):
+            raise CommandError('Only sqlite databases can be copied')
+        while True:
+            self.sync()
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
+
+    def sync(self):
+        source = connections['default']
+        source.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            target = connections[alias]
+            if HAS_BACKUP:
+                target.ensure_connection()
+                source.connection.backup(target.connection)
+            else:
+                self.copy_file(source, target)
+            self.stdout.write('Copied the database to {}'.format(alias))
+
+    @staticmethod
+    def copy_file(source, target):
+        """
+        Copies the database file when the backup API is missing. The read
+        transaction holds a shared lock of the database, so no write is
+        committed during the copy. The copy replaces the replica file at
+        once, so the replica is never read half-copied.
+
+        :param source: connection to the primary database
+        :param target: connection to the replica
+        """
+        target.close()
+        name = target.settings_dict['NAME']
+        with source.cursor() as cursor:
+            cursor.execute('BEGIN')
+            try:
+                cursor.execute('SELECT count(*) FROM sqlite_master')
+                shutil.copyfile(source.settings_dict['NAME'], name + '.tmp')
+            finally:
+                cursor.execute('ROLLBACK')
+        os.replace(name + '.tmp', name)
@@ -0,0 +1,78 @@
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+from app.routers import ReplicaRouter
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryBudgetMiddleware:
+    """
+    Fails the request when a view runs more database queries than its
+    budget in the ``QUERY_BUDGETS`` setting, so a lazy relation accessed
+    in a loop is noticed as soon as the page is opened. Budgets are keyed
+    by the view name, e.g. ``'exam:list'``, and include the session and
+    user queries. The check runs only when ``QUERY_BUDGET_CHECK`` is on.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_CHECK', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # queries of all the databases, including the replicas
+        with ExitStack() as stack:
+            captured = [
+                stack.enter_context(CaptureQueriesContext(connection))
+                for connection in connections.all()
+            ]
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return response
+        budget = settings.QUERY_BUDGETS.get(match.view_name)
+        queries = [query for context in captured for query in context]
+        if budget is not None and len(queries) > budget:
+            raise QueryBudgetExceeded(
+                '{} {} ran {} queries, the budget is {}:\n{}'.format(
+                    request.method, match.view_name, len(queries), budget,
+                    '\n'.join(query['sql'] for query in queries)
+                )
+            )
+        return response
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Pins the reads of a client to the primary database for
+    ``REPLICA_STICKY_SECONDS`` after it wrote, which is longer than the
+    replication lag, so the client sees its own changes. The time is kept
+    in a cookie, as the client may be anonymous. Unused without replicas.
+    """
+
+    COOKIE = 'db_primary'
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        ReplicaRouter.start_request(pinned=self.COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = ReplicaRouter.end_request()
+        if wrote:
+            response.set_cookie(
+                self.COOKIE, '1', httponly=True,
+                max_age=settings.REPLICA_STICKY_SECONDS
+            )
+        return response
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 22:25
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def fill_correct_masks(apps, schema_editor):
+    Question = apps.get_model('app', 'Question')
+    AnswerChoice = apps.get_model('app', 'AnswerChoice')
+    masks = {}
+    answers = (AnswerChoice.objects
+                           .order_by('question_id', 'id')
+                           .values_list('question_id', 'is_correct'))
+    for (question_id, is_correct) in answers.iterator():
+        (mask, count) = masks.get(question_id, (0, 0))
+        masks[question_id] = (mask | (is_correct << count), count + 1)
+    for (question_id, (mask, count)) in masks.items():
+        Question.objects.filter(id=question_id).update(
+            correct_mask=mask, num_answers=count
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_questionset_band'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='correct_mask',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='num_answers',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_correct_masks, migrations.RunPython.noop),
+    ]
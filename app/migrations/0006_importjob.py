@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 22:27
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_question_correct_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='exam_uploads/')),
+                ('exam_name', models.CharField(max_length=30)),
+                ('num_questions', models.IntegerField()),
+                ('has_headers', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('P', 'Pending'), ('R', 'Running'), ('D', 'Done'), ('F', 'Failed'), ('C', 'Cancelled')], default='P', max_length=1)),
+                ('cancel_requested', models.BooleanField(default=False)),
+                ('total_rows', models.IntegerField(default=0)),
+                ('saved_rows', models.IntegerField(default=0)),
+                ('message', models.TextField(blank=True)),
+                ('creation_date', models.DateTimeField(auto_now_add=True)),
+                ('exam', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.Exam')),
+            ],
+        ),
+    ]
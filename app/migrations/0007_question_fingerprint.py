@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 22:29
+from __future__ import unicode_literals
+
+import hashlib
+import json
+
+from django.db import migrations, models
+
+
+def fill_fingerprints(apps, schema_editor):
+    Question = apps.get_model('app', 'Question')
+    AnswerChoice = apps.get_model('app', 'AnswerChoice')
+    questions = Question.objects.order_by('id').values_list('id', 'text', 'type')
+    for (question_id, text, question_type) in questions.iterator():
+        answers = (AnswerChoice.objects.filter(question_id=question_id)
+                                       .order_by('id')
+                                       .values_list('text', 'is_correct'))
+        content = json.dumps([
+            ' '.join(text.split()),
+            question_type,
+            [[' '.join(ans_text.split()), bool(is_correct)]
+             for (ans_text, is_correct) in answers]
+        ])
+        Question.objects.filter(id=question_id).update(
+            fingerprint=hashlib.sha1(content.encode('utf8')).hexdigest()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+        migrations.RunPython(fill_fingerprints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 22:33
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_question_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='examcode',
+            index=models.Index(fields=['exam', 'code'], name='app_examcod_exam_id_e27917_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupexamlink',
+            index=models.Index(fields=['group', 'due_date'], name='app_groupex_group_i_983691_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupexamlink',
+            index=models.Index(fields=['exam', 'due_date'], name='app_groupex_exam_id_c1f7ad_idx'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 22:44
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app', '0008_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnswerRecord',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answer_mask', models.IntegerField()),
+                ('score', models.FloatField()),
+                ('rating_change', models.IntegerField()),
+                ('answer_date', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ExamAttempt',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempt_id', models.CharField(max_length=32, unique=True)),
+                ('num_questions', models.IntegerField()),
+                ('start_rating', models.IntegerField()),
+                ('final_rating', models.IntegerField(blank=True, null=True)),
+                ('score', models.FloatField(blank=True, null=True)),
+                ('start_date', models.DateTimeField(auto_now_add=True)),
+                ('finish_date', models.DateTimeField(blank=True, null=True)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.Exam')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='answerrecord',
+            name='attempt',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='app.ExamAttempt'),
+        ),
+        migrations.AddField(
+            model_name='answerrecord',
+            name='question',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.Question'),
+        ),
+        migrations.AddField(
+            model_name='answerrecord',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='examattempt',
+            index=models.Index(fields=['user', 'start_date'], name='app_examatt_user_id_90f0b7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='examattempt',
+            index=models.Index(fields=['exam', 'start_date'], name='app_examatt_exam_id_719bfe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='answerrecord',
+            index=models.Index(fields=['user', 'answer_date'], name='app_answerr_user_id_074fe8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='answerrecord',
+            index=models.Index(fields=['question', 'answer_date'], name='app_answerr_questio_fa19a8_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 22:53
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_examattempt_answerrecord'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='answerrecord',
+            name='question',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.Question'),
+        ),
+        migrations.AlterField(
+            model_name='examattempt',
+            name='exam',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.Exam'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 22:55
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_attempt_history_set_null'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examattempt',
+            name='question_ids',
+            field=models.TextField(default=''),
+        ),
+    ]
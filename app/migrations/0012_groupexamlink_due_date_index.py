@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 23:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_examattempt_question_ids'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='groupexamlink',
+            index=models.Index(fields=['due_date', 'exam'], name='app_groupex_due_dat_539ed0_idx'),
+        ),
+    ]
@@ -1,12 +1,16 @@
+import hashlib
+import json
+
 from django.db import models
 from django.contrib.auth.models import User
 
 
 class UserX(models.Model):
     """Additional information extending a basic user model"""
+    DEFAULT_RATING = 1500
     user = models.OneToOneField(User)
     code = models.CharField(max_length=16, unique=True)
-    rating = models.IntegerField(default=1500)
+    rating = models.IntegerField(default=DEFAULT_RATING)
 
     def __str__(self):
         return self.code
@@ -60,6 +64,14 @@ class GroupExamLink(models.Model):
     # date when exam was assigned to group
     creation_date = models.DateField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['group', 'due_date']),
+            models.Index(fields=['exam', 'due_date']),
+            # exams still due, excluded from the past exams
+            models.Index(fields=['due_date', 'exam']),
+        ]
+
 
 class ExamCode(models.Model):
     """
@@ -71,6 +83,11 @@ class ExamCode(models.Model):
     # expiration time of the code
     expiry_date = models.DateTimeField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['exam', 'code']),
+        ]
+
     def __str__(self):
         return "Code for test {}".format(self.exam.name)
 
@@ -84,6 +101,7 @@ class Question(models.Model):
         (MULTIPLE_CHOICE, 'Multiple choice'),
     )
     DEFAULT_RATING = 1500
+    MAX_ANSWERS = 31  # number of answers which fit in the correct_mask
     exam = models.ForeignKey(Exam, related_name='questions')
     type = models.CharField(
         max_length=1,
@@ -92,6 +110,16 @@ class Question(models.Model):
     text = models.TextField()
     # the difficulty (rating) of the question
     rating = models.IntegerField(default=DEFAULT_RATING)
+    # bit i is set if the i-th answer (ordered by id) is correct
+    correct_mask = models.IntegerField(default=0, editable=False)
+    num_answers = models.IntegerField(default=0, editable=False)
+    # hash of the question content used to find changes on re-upload
+    fingerprint = models.CharField(max_length=40, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['exam', 'rating']),
+        ]
 
     def __str__(self):
         # noinspection PyTypeChecker
@@ -100,6 +128,56 @@ class Question(models.Model):
         else:
             return "{}: {}".format(self.exam.name, self.text)
 
+    @staticmethod
+    def get_correct_mask(correct_flags):
+        """
+        :param correct_flags: whether each answer is correct, in the order
+            of answer ids
+        :type correct_flags: collections.Iterable[bool]
+        :return: bitmask of the correct answers
+        :rtype: int
+        """
+        return sum(1 << i for (i, flag) in enumerate(correct_flags) if flag)
+
+    @staticmethod
+    def get_fingerprint(text, question_type, answers):
+        """
+        Calculates a hash of the question content. Rating is not included,
+        as it changes as the question is answered.
+
+        :param str text: question text
+        :param str question_type: one of the question types
+        :param answers: texts of the answers and whether they are correct,
+            in the order of answer ids
+        :type answers: collections.Iterable[tuple[str, bool]]
+        :return: hex digest of the content
+        :rtype: str
+        """
+        content = json.dumps([
+            ' '.join(text.split()),
+            question_type,
+            [[' '.join(ans_text.split()), bool(is_correct)]
+             for (ans_text, is_correct) in answers]
+        ])
+        return hashlib.sha1(content.encode('utf8')).hexdigest()
+
+    def update_answers_summary(self):
+        """
+        Recalculates the correct answers mask, number of answers and
+        fingerprint of the question from its answer choices.
+        """
+        answers = list(self.answers.order_by('id')
+                                   .values_list('text', 'is_correct'))
+        self.correct_mask = self.get_correct_mask(
+            is_correct for (_, is_correct) in answers
+        )
+        self.num_answers = len(answers)
+        self.fingerprint = self.get_fingerprint(self.text, self.type, answers)
+        Question.objects.filter(id=self.id).update(
+            correct_mask=self.correct_mask, num_answers=self.num_answers,
+            fingerprint=self.fingerprint
+        )
+
 
 class AnswerChoice(models.Model):
     """Table of answers assigned to a multiple choice question."""
@@ -115,3 +193,134 @@ class AnswerChoice(models.Model):
         else:
             # noinspection PyUnresolvedReferences
             return "Q{}: {}".format(self.question_id, self.text)
+
+
+class QuestionSet(models.Model):
+    """
+    Set of questions drawn before the exam is started.
+
+    The set is either prepared for a particular student (user) or belongs
+    to the shared pool of sets of the exam for a rating band (band).
+    """
+    exam = models.ForeignKey(Exam)
+    user = models.ForeignKey(User, null=True, blank=True)
+    band = models.IntegerField(null=True, blank=True)
+    # comma separated ids of the questions in the order they are asked
+    question_ids = models.TextField()
+    creation_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['exam', 'band']),
+        ]
+
+    def split_ids(self):
+        return [int(i) for i in self.question_ids.split(',') if i]
+
+    @staticmethod
+    def join_ids(ids):
+        return ','.join(str(i) for i in ids)
+
+    def __str__(self):
+        return "Question set of {} for test {}".format(
+            self.user_id, self.exam_id
+        )
+
+
+class ImportJob(models.Model):
+    """Uploaded exam file waiting for or processed by the import worker."""
+    PENDING = 'P'
+    RUNNING = 'R'
+    DONE = 'D'
+    FAILED = 'F'
+    CANCELLED = 'C'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+        (CANCELLED, 'Cancelled'),
+    )
+    file = models.FileField(upload_to='exam_uploads/')
+    exam_name = models.CharField(max_length=30)
+    num_questions = models.IntegerField()
+    has_headers = models.BooleanField(default=False)
+    status = models.CharField(
+        max_length=1,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+    cancel_requested = models.BooleanField(default=False)
+    # last time the worker running the job reported progress
+    heartbeat_date = models.DateTimeField(null=True, blank=True)
+    # number of valid rows in the file and of rows saved so far
+    total_rows = models.IntegerField(default=0)
+    saved_rows = models.IntegerField(default=0)
+    # errors found in the file
+    message = models.TextField(blank=True)
+    # exam updated by the job or the new exam once the job is done
+    exam = models.ForeignKey(Exam, null=True, blank=True,
+                             on_delete=models.SET_NULL)
+    creation_date = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return "Import of {} ({})".format(
+            self.exam_name, self.get_status_display()
+        )
+
+
+class ExamAttempt(models.Model):
+    """Exam attempt of a student, written when the exam is started."""
+    # id of the attempt snapshot in the cache
+    attempt_id = models.CharField(max_length=32, unique=True)
+    user = models.ForeignKey(User)
+    # kept when the exam is deleted
+    exam = models.ForeignKey(Exam, on_delete=models.SET_NULL, null=True)
+    # comma separated ids of the drawn questions in the order they are asked
+    question_ids = models.TextField(default='')
+    num_questions = models.IntegerField()
+    start_rating = models.IntegerField()
+    # filled in when the attempt is finished
+    final_rating = models.IntegerField(null=True, blank=True)
+    score = models.FloatField(null=True, blank=True)
+    start_date = models.DateTimeField(auto_now_add=True)
+    finish_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'start_date']),
+            models.Index(fields=['exam', 'start_date']),
+        ]
+
+    def split_ids(self):
+        return [int(i) for i in self.question_ids.split(',') if i]
+
+    def __str__(self):
+        return "Attempt of {} at test {}".format(self.user_id, self.exam_id)
+
+
+class AnswerRecord(models.Model):
+    """Graded answer to a question of the exam attempt. Never updated."""
+    attempt = models.ForeignKey(ExamAttempt, related_name='answers')
+    # copied from the attempt for lookups of the user's answers
+    user = models.ForeignKey(User)
+    # kept when the question is deleted or replaced by an upload
+    question = models.ForeignKey(
+        Question, on_delete=models.SET_NULL, null=True
+    )
+    # bitmask of the chosen answers, ordered by id
+    answer_mask = models.IntegerField()
+    score = models.FloatField()
+    rating_change = models.IntegerField()
+    answer_date = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'answer_date']),
+            models.Index(fields=['question', 'answer_date']),
+        ]
+
+    def __str__(self):
+        return "Answer of {} to question {}".format(
+            self.user_id, self.question_id
+        )
@@ -0,0 +1,155 @@
+import atexit
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from app.models import AnswerRecord, Question, UserX
+
+
+class RatingUpdateQueue:
+    """
+    Write-behind queue of graded answers and the rating changes they cause.
+
+    Answers and changes are appended to an in-memory queue and written in
+    batches: the answers with one bulk insert, and all the changes of a
+    single user or question summed up and written with one atomic ``F()``
+    increment, all of them in a single transaction.
+    The queue is flushed in a background thread when it reaches
+    ``FLUSH_SIZE`` entries or ``FLUSH_INTERVAL`` seconds after the first
+    queued entry, so the request answering the question does not wait for
+    the write. It is also flushed when an attempt is finished or restored,
+    which need the answers in the database. In the ``SYNCHRONOUS`` mode
+    every entry is written immediately by the request.
+    Options are read from the ``RATING_UPDATES`` setting.
+
+    The queue is kept in memory only. It is flushed when the process exits
+    normally, but the answers queued in the last ``FLUSH_INTERVAL``
+    seconds are lost if the process is killed, or all the queued answers
+    if the database has been failing since. Attempts restored or finished
+    by another process miss the answers still queued in this one. A failed
+    flush keeps the entries and is retried after ``FLUSH_INTERVAL``
+    seconds.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def record(self, user_id, question_id, change, answer=None):
+        """
+        Queues the rating change of the user who answered the question.
+        The question rating changes by the same amount in the opposite
+        direction.
+
+        :param int user_id: id of the user who answered the question
+        :param int question_id: id of the answered question
+        :param int change: rating change of the user
+        :param answer: unsaved answer saved together with the change
+        :type answer: AnswerRecord | None
+        """
+        self.record_many([(user_id, question_id, change, answer)])
+
+    def record_many(self, entries):
+        """
+        Queues the rating changes of several answers at once, so they are
+        written in one transaction in the ``SYNCHRONOUS`` mode.
+
+        :param entries: arguments of ``record`` for each answer
+        :type entries:
+            list[tuple[int, int, int, AnswerRecord | None]]
+        """
+        options = settings.RATING_UPDATES
+        with self._lock:
+            self._entries.extend(entries)
+            if not options['SYNCHRONOUS']:
+                full = len(self._entries) >= options['FLUSH_SIZE']
+                self._start_timer(0 if full else None)
+        if options['SYNCHRONOUS']:
+            self.flush()
+
+    def flush(self):
+        """Writes all the queued answers and changes to the database."""
+        with self._lock:
+            entries, self._entries = self._entries, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not entries:
+            return
+        answers = []
+        user_changes = Counter()
+        question_changes = Counter()
+        for (user_id, question_id, change, answer) in entries:
+            if answer is not None:
+                answers.append(answer)
+            user_changes[user_id] += change
+            question_changes[question_id] -= change
+        try:
+            with transaction.atomic():
+                if answers:
+                    self._save_answers(answers)
+                for (user_id, change) in user_changes.items():
+                    if change:
+                        (UserX.objects.filter(user_id=user_id)
+                                      .update(rating=F('rating') + change))
+                for (question_id, change) in question_changes.items():
+                    if change:
+                        (Question.objects.filter(id=question_id)
+                                         .update(rating=F('rating') + change))
+        except Exception:
+            # keep the entries for the next flush
+            with self._lock:
+                self._entries[:0] = entries
+                self._start_timer()
+            raise
+
+    @staticmethod
+    def _save_answers(answers):
+        """
+        Inserts the answers, unlinked from the questions which were deleted
+        by an exam upload since the answers were queued.
+
+        :param answers: unsaved answers
+        :type answers: list[AnswerRecord]
+        """
+        existing = set(
+            Question.objects.filter(id__in={a.question_id for a in answers})
+                            .values_list('id', flat=True)
+        )
+        for answer in answers:
+            if answer.question_id not in existing:
+                answer.question_id = None
+        AnswerRecord.objects.bulk_create(answers)
+
+    def _start_timer(self, interval=None):
+        """
+        Schedules the flush in ``interval`` seconds, ``FLUSH_INTERVAL`` by
+        default, unless it is scheduled earlier. Needs the lock.
+
+        :param interval: seconds to the flush
+        :type interval: float | None
+        """
+        if interval is None:
+            interval = settings.RATING_UPDATES['FLUSH_INTERVAL']
+        if self._timer is not None:
+            if self._timer.interval <= interval:
+                return
+            self._timer.cancel()
+        self._timer = threading.Timer(interval, self._flush_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            # the timer thread has its own database connection
+            connection.close()
+
+
+rating_updates = RatingUpdateQueue()
+atexit.register(rating_updates.flush)
@@ -0,0 +1,64 @@
+import random
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+
+class ReplicaRouter:
+    """
+    Sends writes to the primary ``default`` database and spreads reads
+    over the databases listed in the ``DATABASE_REPLICAS`` setting.
+
+    Reads go to the primary when the current request is pinned to it
+    (see ``app.middleware.ReplicaStickinessMiddleware``), after the
+    current thread wrote and inside transactions, so every client reads
+    its own writes. Sessions are always read from the primary as they
+    are written on most requests.
+    """
+
+    _state = threading.local()
+
+    @classmethod
+    def start_request(cls, pinned=False):
+        """
+        :param bool pinned: whether reads of the request go to the primary
+        """
+        cls._state.pinned = pinned
+        cls._state.wrote = False
+
+    @classmethod
+    def end_request(cls):
+        """
+        :return: whether the request wrote to the primary
+        :rtype: bool
+        """
+        wrote = getattr(cls._state, 'wrote', False)
+        cls._state.pinned = cls._state.wrote = False
+        return wrote
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (not replicas or model._meta.app_label == 'sessions' or
+                getattr(self._state, 'pinned', False) or
+                getattr(self._state, 'wrote', False) or
+                connections['default'].in_atomic_block):
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != 'sessions':
+            self._state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default'} | set(settings.DATABASE_REPLICAS)
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas receive the schema from the primary
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
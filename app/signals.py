@@ -0,0 +1,83 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from app.exam_codes import ExamCodeCache
+from app.exam_lists import UserExamList
+from app.exam_tools import QuestionIndex, QuestionPool
+from app.models import (AnswerChoice, Exam, ExamCode, Group, GroupExamLink,
+                        Question)
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, update_fields=None, **kwargs):
+    # rating updates are picked up when the index expires
+    if update_fields is not None and set(update_fields) == {'rating'}:
+        return
+    QuestionIndex.invalidate(instance.exam_id)
+    QuestionPool.invalidate(instance.exam_id)
+    instance.update_answers_summary()
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    QuestionIndex.invalidate(instance.exam_id)
+    QuestionPool.invalidate(instance.exam_id)
+
+
+@receiver(post_save, sender=AnswerChoice)
+@receiver(post_delete, sender=AnswerChoice)
+def answer_changed(sender, instance, **kwargs):
+    question = Question.objects.filter(id=instance.question_id).first()
+    if question is not None:
+        question.update_answers_summary()
+
+
+@receiver(pre_save, sender=Exam)
+def exam_resized(sender, instance, **kwargs):
+    # drawn question sets have the previous number of questions
+    if instance.id is None:
+        return
+    num_questions = (Exam.objects
+                         .filter(id=instance.id)
+                         .values_list('num_questions', flat=True)
+                         .first())
+    if num_questions not in (None, instance.num_questions):
+        QuestionPool.invalidate(instance.id)
+
+
+@receiver(post_save, sender=Exam)
+def exam_saved(sender, instance, created, **kwargs):
+    if not created:
+        UserExamList.invalidate_exam(instance.id)
+
+
+@receiver(post_save, sender=ExamCode)
+@receiver(post_delete, sender=ExamCode)
+def exam_code_changed(sender, instance, **kwargs):
+    ExamCodeCache.invalidate(instance.exam_id)
+
+
+@receiver(post_save, sender=GroupExamLink)
+@receiver(post_delete, sender=GroupExamLink)
+def group_exam_link_changed(sender, instance, **kwargs):
+    UserExamList.invalidate_groups([instance.group_id])
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    # members are removed without the m2m_changed signal
+    UserExamList.invalidate_groups([instance.id])
+
+
+@receiver(m2m_changed, sender=Group.members.through)
+def group_members_changed(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    if reverse:
+        # groups of the user changed
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            UserExamList.invalidate([instance.id])
+    elif action in ('post_add', 'post_remove'):
+        UserExamList.invalidate(pk_set)
+    elif action == 'pre_clear':
+        UserExamList.invalidate_groups([instance.id])
@@ -0,0 +1,1391 @@
+import datetime
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import unittest
+from collections import Counter
+from contextlib import contextmanager
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import (ConnectionHandler, DatabaseError, connection,
+                       connections, transaction)
+from django.db.backends.utils import CursorWrapper
+from django.db.models.query import QuerySet
+from django.forms import inlineformset_factory
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from app.attempts import AttemptSnapshot, AttemptToken
+from app.exam_bank import ExamBankReader, ExamBankWriter, open_bank_file
+from app.exam_codes import ExamCodeCache
+from app.exam_lists import UserExamList
+from app.exam_tools import (ExamUploader, ImportCancelled, QuestionIndex,
+                            QuestionPool, RandomQuestion, RatedQuestion)
+from app.forms import AnswerChoiceFormSet
+from app.jobs import ImportJobRunner
+from app.management.commands import sync_replica
+from app.middleware import QueryBudgetExceeded, ReplicaStickinessMiddleware
+from app.ratings import RatingUpdateQueue, rating_updates
+from app.models import (AnswerChoice, AnswerRecord, Exam, ExamAttempt,
+                        ExamCode, Group, GroupExamLink, ImportJob,
+                        Question, QuestionSet, RegistrationCode, UserX)
+from app.routers import ReplicaRouter
+from lo01testy import settings_replica
+
+TEST_SETTINGS = {
+    'CACHES': {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }
+    },
+    'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+    'RATING_UPDATES': {
+        'FLUSH_SIZE': 100, 'FLUSH_INTERVAL': 60, 'SYNCHRONOUS': False
+    },
+    'QUERY_BUDGET_CHECK': False,
+}
+
+
+@contextmanager
+def count_rows():
+    """
+    Counts the rows fetched by the queries run inside the block.
+
+    :return: list which holds the number of rows after the block
+    :rtype: list[int]
+    """
+    fetched = [0]
+
+    def wrap(name, count):
+        def fetch(wrapper, *args):
+            rows = getattr(wrapper.cursor, name)(*args)
+            fetched[0] += count(rows)
+            return rows
+        return fetch
+
+    with mock.patch.object(
+            CursorWrapper, 'fetchone', create=True,
+            new=wrap('fetchone', lambda row: row is not None)), \
+        mock.patch.object(
+            CursorWrapper, 'fetchmany', create=True,
+            new=wrap('fetchmany', len)), \
+        mock.patch.object(
+            CursorWrapper, 'fetchall', create=True,
+            new=wrap('fetchall', len)):
+        yield fetched
+
+
+class ExamDataTestCase(TransactionTestCase):
+    """
+    Seeds an exam of 200 questions taken by a student who belongs to
+    three groups with 60 assigned exams, half of them past ones.
+    Queries run outside of a transaction, as they do in the views.
+    """
+
+    NUM_QUESTIONS = 20
+
+    def setUp(self):
+        cache.clear()
+        ExamCodeCache._exams.clear()
+        QuestionIndex._exams.clear()
+        self.seed(self)
+        self.addCleanup(rating_updates.flush)
+        self.client.force_login(self.user)
+
+    @staticmethod
+    def seed(cls):
+        uploader = ExamUploader('Exam', cls.NUM_QUESTIONS)
+        uploader.load_csv(io.StringIO('\n'.join(
+            'Question {0},{1},{2},a{0},1,b{0},0,c{0},{3}'.format(
+                i, 'SM'[i % 2], 1000 + 5 * i, i % 2
+            )
+            for i in range(200)
+        )))
+        cls.exam = uploader.save_to_db()
+        ExamCode.objects.create(
+            exam=cls.exam, code='CODE',
+            expiry_date=timezone.now() + datetime.timedelta(days=1)
+        )
+        cls.user = User.objects.create_user('student', password='secret')
+        UserX.objects.create(user=cls.user, code='S1', rating=1300)
+        today = timezone.now().date()
+        exams = [cls.exam] + [
+            Exam.objects.create(name='Exam {}'.format(i), num_questions=10)
+            for i in range(59)
+        ]
+        for g in range(3):
+            group = Group.objects.create(name='Group {}'.format(g))
+            group.members.add(cls.user)
+            for (i, exam) in enumerate(exams[g::3]):
+                GroupExamLink.objects.create(
+                    group=group, exam=exam,
+                    due_date=today + datetime.timedelta(days=i - 10)
+                )
+
+    def start_exam(self):
+        self.client.post(
+            reverse('exam:start', args=[self.exam.id]), {'code': 'CODE'}
+        )
+        return self.get_attempt()
+
+    def get_attempt(self):
+        token = AttemptToken.loads(self.client.session['attempt'])
+        return AttemptSnapshot.load(token.attempt_id)
+
+    def answer(self, attempt):
+        return self.client.post(
+            reverse('exam:question'), {'answer': self.answer_data(attempt)}
+        )
+
+    @classmethod
+    def answer_data(cls, attempt):
+        return cls.choose_answer(attempt.questions[attempt.position])
+
+    @staticmethod
+    def choose_answer(question):
+        (answer_id, _) = question.answers[0]
+        return answer_id if question.type == 'S' else [answer_id]
+
+
+@override_settings(**TEST_SETTINGS)
+class QueryBudgetTest(ExamDataTestCase):
+    """
+    Numbers of queries and fetched rows of the views, which grow when
+    a lazy relation is accessed in a loop. Signed cookie sessions do not
+    query the database, so only the user is loaded before the view.
+    """
+
+    def assertBudget(self, queries, rows, method, url, data=None):
+        with count_rows() as fetched, self.assertNumQueries(queries):
+            response = getattr(self.client, method)(url, data)
+        self.assertLessEqual(fetched[0], rows)
+        self.assertLess(response.status_code, 400)
+        return response
+
+    def test_login(self):
+        self.client.logout()
+        # user, last login update in a transaction
+        self.assertBudget(
+            3, 1, 'post', reverse('accounts:login'),
+            {'username': 'student', 'password': 'secret'}
+        )
+
+    def test_profile(self):
+        self.assertBudget(1, 1, 'get', reverse('accounts:profile'))
+
+    def test_exams_list(self):
+        url = reverse('exam:list')
+        # user, upcoming exams, first page of past exams
+        self.assertBudget(3, 1 + 30 + 21, 'get', url)
+        # lists are cached
+        response = self.assertBudget(1, 1, 'get', url)
+        self.assertBudget(
+            2, 1 + 21, 'get', url, {'before': response.context['next_cursor']}
+        )
+
+    def test_exam_info(self):
+        # user, exam, assignments with their groups
+        self.assertBudget(
+            3, 1 + 1 + 1, 'get', reverse('exam:info', args=[self.exam.id])
+        )
+
+    def test_exam_start(self):
+        url = reverse('exam:start', args=[self.exam.id])
+        self.assertBudget(2, 2, 'get', url)
+        # user, exam, code, prepared set, pooled sets, candidates,
+        # attempt, questions, answers
+        self.assertBudget(
+            10, 1 + 1 + 1 + 200 + self.NUM_QUESTIONS * 4, 'post', url,
+            {'code': 'CODE'}
+        )
+        # and the unfinished attempt finished
+        QuestionIndex.invalidate(self.exam.id)
+        self.assertBudget(
+            11, 1 + 1 + 1 + 200 + self.NUM_QUESTIONS * 4, 'post', url,
+            {'code': 'CODE'}
+        )
+
+    def test_question(self):
+        attempt = self.start_exam()
+        url = reverse('exam:question')
+        self.assertBudget(1, 1, 'get', url)
+        # user, the answer is queued
+        self.assertBudget(1, 1, 'post', url, {
+            'answer': self.answer_data(attempt)
+        })
+
+    @override_settings(RATING_UPDATES={
+        'FLUSH_SIZE': 1, 'FLUSH_INTERVAL': 60, 'SYNCHRONOUS': True
+    })
+    def test_question_synchronous_ratings(self):
+        attempt = self.start_exam()
+        # and in a transaction: existing questions, answer, both ratings
+        self.assertBudget(6, 1 + 1, 'post', reverse('exam:question'), {
+            'answer': self.answer_data(attempt)
+        })
+
+    def test_question_restored(self):
+        attempt = self.start_exam()
+        self.answer(attempt)
+        AttemptSnapshot.discard(attempt.attempt_id)
+        # user, attempt, the queued answer written in a transaction,
+        # answers, questions, answers of the questions
+        self.assertBudget(
+            1 + 1 + 5 + 3, 1 + 1 + 1 + 1 + self.NUM_QUESTIONS * 4, 'get',
+            reverse('exam:question')
+        )
+        self.assertEqual(self.get_attempt().position, 1)
+
+    @override_settings(
+        QUERY_BUDGET_CHECK=True,
+        RATING_UPDATES={
+            'FLUSH_SIZE': 1, 'FLUSH_INTERVAL': 60, 'SYNCHRONOUS': True
+        }
+    )
+    def test_middleware_budget_covers_worst_case(self):
+        attempt = self.start_exam()
+        AttemptSnapshot.discard(attempt.attempt_id)
+        try:
+            self.client.post(reverse('exam:question'), {
+                'answer': self.answer_data(attempt)
+            })
+        except QueryBudgetExceeded as e:
+            self.fail(str(e))
+        self.assertEqual(AnswerRecord.objects.count(), 1)
+
+    @override_settings(QUERY_BUDGET_CHECK=True)
+    def test_middleware_budget_covers_queued_answers(self):
+        attempt = self.start_exam()
+        self.answer(attempt)
+        attempt = self.get_attempt()
+        AttemptSnapshot.discard(attempt.attempt_id)
+        try:
+            self.client.post(reverse('exam:question'), {
+                'answer': self.answer_data(attempt)
+            })
+        except QueryBudgetExceeded as e:
+            self.fail(str(e))
+        rating_updates.flush()
+        self.assertEqual(AnswerRecord.objects.count(), 2)
+
+
+@override_settings(**TEST_SETTINGS)
+class ExamCodeCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.exam = Exam.objects.create(name='Exam', num_questions=1)
+        cls.expiry_date = timezone.now() + datetime.timedelta(hours=1)
+        ExamCode.objects.create(
+            exam=cls.exam, code='CODE', expiry_date=cls.expiry_date
+        )
+
+    def setUp(self):
+        cache.clear()
+        ExamCodeCache._exams.clear()
+
+    def is_valid(self, code):
+        return ExamCodeCache.is_valid(self.exam.id, code)
+
+    def test_expired_code_rejected(self):
+        self.assertTrue(self.is_valid('CODE'))
+        later = self.expiry_date + datetime.timedelta(seconds=1)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            with self.assertNumQueries(0):
+                self.assertFalse(self.is_valid('CODE'))
+            (_, _, codes) = ExamCodeCache._exams[self.exam.id]
+            self.assertNotIn('CODE', codes)
+            # the evicted code is looked up and rejected by the database
+            with self.assertNumQueries(1):
+                self.assertFalse(self.is_valid('CODE'))
+
+    def test_code_added_in_other_process(self):
+        self.assertFalse(self.is_valid('NEW'))
+        # without the signals, as if saved by another process
+        ExamCode.objects.bulk_create([ExamCode(
+            exam=self.exam, code='NEW', expiry_date=self.expiry_date
+        )])
+        self.assertTrue(self.is_valid('NEW'))
+        with self.assertNumQueries(0):
+            self.assertTrue(self.is_valid('NEW'))
+
+    def test_invalidated_in_other_processes(self):
+        self.assertTrue(self.is_valid('CODE'))
+        stale = ExamCodeCache._exams[self.exam.id]
+        ExamCode.objects.filter(code='CODE').update(
+            expiry_date=timezone.now() - datetime.timedelta(hours=1)
+        )
+        ExamCodeCache.invalidate(self.exam.id)
+        # another process still holds the codes loaded before the change
+        ExamCodeCache._exams[self.exam.id] = stale
+        self.assertFalse(self.is_valid('CODE'))
+
+    def test_invalidated_by_signals(self):
+        self.assertTrue(self.is_valid('CODE'))
+        code = ExamCode.objects.get()
+        code.expiry_date = timezone.now() - datetime.timedelta(hours=1)
+        code.save()
+        self.assertFalse(self.is_valid('CODE'))
+        code.expiry_date = self.expiry_date
+        code.save()
+        self.assertTrue(self.is_valid('CODE'))
+        code.delete()
+        self.assertFalse(self.is_valid('CODE'))
+
+
+@override_settings(**TEST_SETTINGS)
+class ExamListTest(TestCase):
+    """
+    Cached exam lists of the users, which must be dropped by every change
+    of the exams, their assignments or the group members.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('student')
+        UserX.objects.create(user=self.user, code='S1', rating=1300)
+        self.group = Group.objects.create(name='Group')
+        self.group.members.add(self.user)
+        self.exam = Exam.objects.create(name='Exam', num_questions=1)
+        self.other_exam = Exam.objects.create(name='Other', num_questions=1)
+        self.today = timezone.now().date()
+        self.link = GroupExamLink.objects.create(
+            group=self.group, exam=self.exam, due_date=self.today
+        )
+        self.client.force_login(self.user)
+
+    def listed(self):
+        """
+        :return: names of the upcoming and of the past exams of the user
+        :rtype: tuple[list[str], list[str]]
+        """
+        response = self.client.get(reverse('exam:list'))
+        return (
+            [exam['name'] for exam in response.context['exams']],
+            [exam['name'] for exam in response.context['old_exams']]
+        )
+
+    def test_link_changed(self):
+        self.assertEqual(self.listed(), (['Exam'], []))
+        GroupExamLink.objects.create(
+            group=self.group, exam=self.other_exam, due_date=self.today
+        )
+        self.assertEqual(self.listed(), (['Exam', 'Other'], []))
+        self.link.due_date = self.today - datetime.timedelta(days=1)
+        self.link.save()
+        self.assertEqual(self.listed(), (['Other'], ['Exam']))
+        self.link.delete()
+        self.assertEqual(self.listed(), (['Other'], []))
+
+    def test_members_changed(self):
+        self.assertEqual(self.listed(), (['Exam'], []))
+        self.group.members.remove(self.user)
+        self.assertEqual(self.listed(), ([], []))
+        self.group.members.add(self.user)
+        self.assertEqual(self.listed(), (['Exam'], []))
+        self.group.members.clear()
+        self.assertEqual(self.listed(), ([], []))
+
+    def test_groups_of_user_changed(self):
+        self.assertEqual(self.listed(), (['Exam'], []))
+        self.user.group_set.remove(self.group)
+        self.assertEqual(self.listed(), ([], []))
+        self.user.group_set.add(self.group)
+        self.assertEqual(self.listed(), (['Exam'], []))
+        self.user.group_set.clear()
+        self.assertEqual(self.listed(), ([], []))
+
+    def test_group_deleted(self):
+        self.assertEqual(self.listed(), (['Exam'], []))
+        self.group.delete()
+        self.assertEqual(self.listed(), ([], []))
+
+    def test_exam_renamed(self):
+        self.assertEqual(self.listed(), (['Exam'], []))
+        self.exam.name = 'Renamed'
+        self.exam.save()
+        self.assertEqual(self.listed(), (['Renamed'], []))
+
+
+@override_settings(**TEST_SETTINGS)
+class RatingUpdateQueueTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        uploader = ExamUploader('Exam', 2)
+        uploader.load_csv(io.StringIO('Question 1,S,1000,a,1,b,0\n'
+                                      'Question 2,S,1000,a,1,b,0'))
+        cls.exam = uploader.save_to_db()
+        (cls.q1, cls.q2) = cls.exam.questions.order_by('id')
+        cls.user = User.objects.create_user('student')
+        UserX.objects.create(user=cls.user, code='S1', rating=1300)
+
+    def setUp(self):
+        self.queue = RatingUpdateQueue()
+        self.addCleanup(self.queue.flush)
+
+    def create_answer(self, attempt, question, change):
+        return AnswerRecord(
+            attempt=attempt, user=self.user, question_id=question.id,
+            answer_mask=1, score=1, rating_change=change,
+            answer_date=timezone.now()
+        )
+
+    def ratings(self):
+        return (UserX.objects.get(user=self.user).rating,
+                Question.objects.get(id=self.q1.id).rating,
+                Question.objects.get(id=self.q2.id).rating)
+
+    def test_changes_summed(self):
+        self.queue.record(self.user.id, self.q1.id, 10)
+        self.queue.record(self.user.id, self.q2.id, -4)
+        self.queue.record(self.user.id, self.q1.id, 5)
+        self.assertEqual(self.ratings(), (1300, 1000, 1000))
+        # changed in the meantime by another process
+        UserX.objects.filter(user=self.user).update(rating=1400)
+        with CaptureQueriesContext(connection) as queries:
+            self.queue.flush()
+        updates = [q for q in queries if q['sql'].startswith('UPDATE')]
+        # one increment of the user and of each question
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(self.ratings(), (1411, 985, 1004))
+        self.queue.flush()
+        self.assertEqual(self.ratings(), (1411, 985, 1004))
+
+    def test_answers_saved(self):
+        attempt = ExamAttempt.objects.create(
+            attempt_id='attempt', user=self.user, exam=self.exam,
+            num_questions=2, start_rating=1300
+        )
+        self.queue.record_many([
+            (self.user.id, question.id, change,
+             self.create_answer(attempt, question, change))
+            for (question, change) in [(self.q1, 10), (self.q2, 5)]
+        ])
+        self.assertFalse(AnswerRecord.objects.exists())
+        with mock.patch.object(UserX.objects, 'filter',
+                               side_effect=DatabaseError), \
+                mock.patch.object(self.queue, '_start_timer'):
+            with self.assertRaises(DatabaseError):
+                self.queue.flush()
+        self.assertFalse(AnswerRecord.objects.exists())
+        # deleted while the answer was queued
+        Question.objects.filter(id=self.q2.id).delete()
+        self.queue.flush()
+        self.assertEqual(
+            list(AnswerRecord.objects.values_list('question', 'rating_change')
+                                     .order_by('rating_change')),
+            [(None, 5), (self.q1.id, 10)]
+        )
+        self.assertEqual(UserX.objects.get(user=self.user).rating, 1315)
+
+    @override_settings(RATING_UPDATES={
+        'FLUSH_SIZE': 2, 'FLUSH_INTERVAL': 60, 'SYNCHRONOUS': False
+    })
+    def test_flushed_when_full(self):
+        with mock.patch.object(self.queue, '_start_timer') as start_timer:
+            self.queue.record(self.user.id, self.q1.id, 10)
+            start_timer.assert_called_once_with(None)
+            self.queue.record(self.user.id, self.q2.id, 10)
+            start_timer.assert_called_with(0)
+
+    def test_earlier_timer_kept(self):
+        with mock.patch('threading.Timer') as timer:
+            timer.side_effect = lambda interval, _: mock.Mock(
+                interval=interval
+            )
+            self.queue.record(self.user.id, self.q1.id, 10)
+            self.assertEqual(self.queue._timer.interval, 60)
+            self.queue._start_timer(0)
+            self.assertEqual(self.queue._timer.interval, 0)
+            self.queue._start_timer()
+            self.assertEqual(self.queue._timer.interval, 0)
+            self.queue.flush()
+        self.assertIsNone(self.queue._timer)
+
+    @override_settings(RATING_UPDATES={
+        'FLUSH_SIZE': 1, 'FLUSH_INTERVAL': 60, 'SYNCHRONOUS': True
+    })
+    def test_failed_flush_keeps_changes(self):
+        with mock.patch.object(UserX.objects, 'filter',
+                               side_effect=DatabaseError), \
+                mock.patch.object(self.queue, '_start_timer') as start_timer:
+            with self.assertRaises(DatabaseError):
+                self.queue.record(self.user.id, self.q1.id, 10)
+            with self.assertRaises(DatabaseError):
+                self.queue.record(self.user.id, self.q2.id, 5)
+            # retried after the interval
+            start_timer.assert_called_with()
+        self.assertEqual(self.ratings(), (1300, 1000, 1000))
+        self.queue.flush()
+        self.assertEqual(self.ratings(), (1315, 990, 995))
+
+
+@override_settings(**TEST_SETTINGS)
+class AttemptViewTest(ExamDataTestCase):
+
+    def submit(self, answers):
+        return self.client.post(
+            reverse('exam:attempt_submit'), json.dumps(answers),
+            content_type='application/json'
+        )
+
+    def all_answers(self, attempt):
+        return {
+            question.id: self.choose_answer(question)
+            for question in attempt.questions[attempt.position:]
+        }
+
+    def test_attempt(self):
+        response = self.client.get(reverse('exam:attempt'))
+        self.assertEqual(response.status_code, 404)
+        attempt = self.start_exam()
+        self.answer(attempt)
+        data = self.client.get(reverse('exam:attempt')).json()
+        self.assertEqual(data['exam_name'], 'Exam')
+        self.assertEqual(
+            [q['id'] for q in data['questions']],
+            [q.id for q in attempt.questions[1:]]
+        )
+        question = attempt.questions[1]
+        self.assertEqual(data['questions'][0]['answers'], [
+            {'id': ans_id, 'text': ans_text}
+            for (ans_id, ans_text) in question.answers
+        ])
+
+    def test_submit(self):
+        attempt = self.start_exam()
+        self.answer(attempt)
+        attempt = self.get_attempt()
+        data = self.submit(self.all_answers(attempt)).json()
+        self.assertEqual(
+            [r['id'] for r in data['results']],
+            [q.id for q in attempt.questions[1:]]
+        )
+        self.assertNotIn('attempt', self.client.session)
+        rating_updates.flush()
+        record = ExamAttempt.objects.get()
+        self.assertIsNotNone(record.finish_date)
+        self.assertEqual(record.final_rating, data['rating'])
+        self.assertEqual(UserX.objects.get(user=self.user).rating,
+                         data['rating'])
+        self.assertEqual(AnswerRecord.objects.count(), self.NUM_QUESTIONS)
+
+    def test_submit_missing_answers(self):
+        attempt = self.start_exam()
+        answers = self.all_answers(attempt)
+        missing = [q.id for q in attempt.questions[-2:]]
+        for question_id in missing:
+            del answers[question_id]
+        response = self.submit(answers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(response.json()['errors']),
+                         sorted(str(i) for i in missing))
+        self.assertFalse(AnswerRecord.objects.exists())
+        self.assertIsNone(ExamAttempt.objects.get().finish_date)
+
+    def test_submit_invalid_answers(self):
+        attempt = self.start_exam()
+        answers = self.all_answers(attempt)
+        question = attempt.questions[0]
+        answers[question.id] = -1 if question.type == 'S' else [-1]
+        response = self.submit(answers)
+        self.assertEqual(list(response.json()['errors']), [str(question.id)])
+        response = self.client.post(
+            reverse('exam:attempt_submit'), '[1, 2',
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(AnswerRecord.objects.exists())
+
+    def replay(self, session):
+        """Restores an old session cookie, as a replaying client would."""
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session
+
+    def test_old_session_replayed(self):
+        attempt = self.start_exam()
+        session = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.answer(attempt)
+        self.replay(session)
+        response = self.answer(attempt)
+        self.assertRedirects(response, reverse('exam:question'))
+        rating_updates.flush()
+        self.assertEqual(AnswerRecord.objects.count(), 1)
+        # the token is moved to the position of the attempt
+        self.assertEqual(
+            AttemptToken.loads(self.client.session['attempt']).position, 1
+        )
+
+    def test_submit_replayed(self):
+        attempt = self.start_exam()
+        session = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        answers = self.all_answers(attempt)
+        self.submit(answers)
+        self.replay(session)
+        self.assertEqual(self.submit(answers).status_code, 404)
+        self.assertEqual(AnswerRecord.objects.count(), self.NUM_QUESTIONS)
+
+    def test_token_behind_attempt(self):
+        attempt = self.start_exam()
+        self.answer(attempt)
+        session = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        attempt = self.get_attempt()
+        self.answer(attempt)
+        self.replay(session)
+        # the page shows the question of the attempt, not of the token
+        response = self.client.get(reverse('exam:question'))
+        self.assertEqual(response.context['question'].id,
+                         attempt.questions[2].id)
+        self.replay(session)
+        self.answer(attempt)
+        rating_updates.flush()
+        self.assertEqual(AnswerRecord.objects.count(), 2)
+        # the snapshot expired, the position is restored from the answers
+        AttemptSnapshot.discard(attempt.attempt_id)
+        self.replay(session)
+        self.answer(attempt)
+        self.assertEqual(
+            list(AnswerRecord.objects.order_by('id')
+                                     .values_list('question_id', flat=True)),
+            [q.id for q in attempt.questions[:2]]
+        )
+
+    @override_settings(RATING_UPDATES={
+        'FLUSH_SIZE': 1, 'FLUSH_INTERVAL': 60, 'SYNCHRONOUS': True
+    })
+    def test_failed_synchronous_flush_not_repeated(self):
+        attempt = self.start_exam()
+        with mock.patch.object(UserX.objects, 'filter',
+                               side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.answer(attempt)
+        # the session was not saved, the answer is sent again
+        response = self.client.post(reverse('exam:question'), {
+            'answer': self.answer_data(attempt)
+        })
+        self.assertRedirects(response, reverse('exam:question'))
+        rating_updates.flush()
+        [record] = AnswerRecord.objects.all()
+        self.assertEqual(UserX.objects.get(user=self.user).rating,
+                         1300 + record.rating_change)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'sqlite test database')
+@override_settings(DATABASE_REPLICAS=settings_replica.DATABASE_REPLICAS,
+                   **TEST_SETTINGS)
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    Routing of the queries with the replica of ``settings_replica``, which
+    mirrors the in-memory test database as it does in the tests run with
+    these settings.
+    """
+
+    def setUp(self):
+        (alias,) = settings_replica.DATABASE_REPLICAS
+        connections.databases[alias] = dict(
+            settings_replica.DATABASES[alias],
+            NAME=connection.settings_dict['NAME']
+        )
+        self.addCleanup(connections.databases.pop, alias)
+        self.addCleanup(lambda: connections[alias].close())
+        self.replica = connections[alias]
+        self.user = User.objects.create_user('student', password='secret')
+        UserX.objects.create(user=self.user, code='S1', rating=1300)
+        # reads after the writes outside of a request stay on the primary
+        ReplicaRouter.end_request()
+
+    @contextmanager
+    def assertRouted(self, num_primary, num_replica):
+        with CaptureQueriesContext(connection) as primary, \
+                CaptureQueriesContext(self.replica) as replica:
+            yield
+        self.assertEqual(
+            (len(primary), len(replica)), (num_primary, num_replica),
+            [q['sql'] for q in primary] + ['--'] + [q['sql'] for q in replica]
+        )
+
+    def test_reads_routed(self):
+        with self.assertRouted(0, 1):
+            Exam.objects.count()
+        with self.assertRouted(2, 0):
+            with transaction.atomic():
+                Exam.objects.count()
+        ReplicaRouter.start_request()
+        with self.assertRouted(3, 0):
+            Exam.objects.create(name='Exam', num_questions=1)
+            # the request reads its own write
+            Exam.objects.count()
+        self.assertTrue(ReplicaRouter.end_request())
+        ReplicaRouter.start_request(pinned=True)
+        with self.assertRouted(1, 0):
+            Exam.objects.count()
+        self.assertFalse(ReplicaRouter.end_request())
+
+    def test_sticky_cookie(self):
+        cookie = ReplicaStickinessMiddleware.COOKIE
+        # the user is read from the replica, last login written
+        with self.assertRouted(2, 1):
+            self.client.post(reverse('accounts:login'),
+                             {'username': 'student', 'password': 'secret'})
+        self.assertEqual(self.client.cookies[cookie]['max-age'],
+                         settings.REPLICA_STICKY_SECONDS)
+        with self.assertRouted(1, 0):
+            self.client.get(reverse('accounts:profile'))
+        del self.client.cookies[cookie]
+        with self.assertRouted(0, 1):
+            self.client.get(reverse('accounts:profile'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class SyncReplicaTest(SimpleTestCase):
+
+    def sync(self):
+        with tempfile.TemporaryDirectory() as directory:
+            databases = ConnectionHandler({
+                alias: {
+                    'ENGINE': 'django.db.backends.sqlite3',
+                    'NAME': os.path.join(directory, alias + '.sqlite3'),
+                }
+                for alias in ('default', 'replica')
+            })
+            with databases['default'].cursor() as cursor:
+                cursor.execute('CREATE TABLE exam (name TEXT)')
+                cursor.execute("INSERT INTO exam VALUES ('Exam')")
+            with mock.patch.object(sync_replica, 'connections', databases):
+                call_command('sync_replica', stdout=io.StringIO())
+            with databases['replica'].cursor() as cursor:
+                cursor.execute('SELECT name FROM exam')
+                self.assertEqual(cursor.fetchall(), [('Exam',)])
+            for database in databases.all():
+                database.close()
+
+    @unittest.skipUnless(sync_replica.HAS_BACKUP, 'sqlite3 backup API')
+    def test_backup(self):
+        self.sync()
+
+    def test_file_copied(self):
+        with mock.patch.object(sync_replica, 'HAS_BACKUP', False):
+            self.sync()
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'sqlite query plans')
+class QueryPlanTest(TestCase):
+    """
+    Query plans of the hot lookups, which must search an index rather
+    than scan a table or a whole index. The parameters are placeholders,
+    only the plans matter.
+    """
+
+    def assertNoScan(self, queryset):
+        (sql, params) = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        scans = [step for step in plan if step.startswith('SCAN')]
+        self.assertFalse(scans, '\n'.join(plan))
+
+    def test_exam_code(self):
+        self.assertNoScan(
+            ExamCode.objects.filter(code='code').filter(exam_id=1)
+        )
+
+    def test_registration_code(self):
+        self.assertNoScan(RegistrationCode.objects.filter(code='code'))
+
+    def test_group_exams_by_due_date(self):
+        self.assertNoScan(GroupExamLink.objects.filter(
+            group_id=1, due_date__gte=datetime.date.today()
+        ))
+
+    def test_questions_by_rating(self):
+        self.assertNoScan(
+            Question.objects.filter(exam_id=1).order_by('rating')
+                            .values_list('id', 'rating')
+        )
+
+    def test_question_pool(self):
+        self.assertNoScan(
+            QuestionSet.objects.filter(exam_id=1, band=15, user=None)
+        )
+
+    def test_prepared_question_set(self):
+        self.assertNoScan(
+            QuestionSet.objects.filter(exam_id=1, user_id=1).order_by('id')
+        )
+
+    def test_upcoming_exams(self):
+        self.assertNoScan(
+            UserExamList.upcoming_exams(1, datetime.date.today())
+        )
+
+    def test_past_exams(self):
+        self.assertNoScan(UserExamList.old_exams(1, datetime.date.today()))
+
+    def test_attempt(self):
+        self.assertNoScan(
+            ExamAttempt.objects.filter(attempt_id='id', user_id=1,
+                                       finish_date=None)
+        )
+        self.assertNoScan(AnswerRecord.objects.filter(attempt_id=1))
+
+
+class ExamBankTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        uploader = ExamUploader('Exam', 5)
+        uploader.load_csv(io.StringIO('\n'.join(
+            'Pytanie ż {0},{1},{2},a{0},1,b{0},0,c{0},{3}'.format(
+                i, 'SM'[i % 2], 1000 + 7 * i, i % 2
+            )
+            for i in range(30)
+        )))
+        cls.exam = uploader.save_to_db()
+        # ratings changed by the answers are exported
+        Question.objects.filter(exam=cls.exam, type='S').update(rating=1234)
+
+    @staticmethod
+    def dump(exam):
+        return [
+            (q.text, q.type, q.rating, q.correct_mask, q.num_answers,
+             q.fingerprint,
+             list(q.answers.order_by('id').values_list('text', 'is_correct')))
+            for q in exam.questions.order_by('id')
+        ]
+
+    def round_trip(self, file_name):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, file_name)
+            with open_bank_file(path, 'w') as file:
+                ExamBankWriter(file).write_exam(self.exam)
+            with open_bank_file(path, 'r') as file:
+                [exam] = ExamBankReader(file).import_exams(chunk_size=7)
+        self.assertEqual(exam.name, self.exam.name)
+        self.assertEqual(exam.num_questions, self.exam.num_questions)
+        self.assertEqual(self.dump(exam), self.dump(self.exam))
+
+    def test_round_trip(self):
+        self.round_trip('bank.ndjson')
+
+    def test_round_trip_gzip(self):
+        self.round_trip('bank.ndjson.gz')
+
+    def import_question(self, question):
+        file = io.StringIO('\n'.join(json.dumps(line) for line in [
+            {'format': ExamBankWriter.FORMAT,
+             'version': ExamBankWriter.VERSION},
+            {'exam': {'name': 'Imported', 'num_questions': 1,
+                      'num_rows': 1}},
+            {'question': question},
+        ]))
+        ExamBankReader(file).import_exams()
+
+    def test_invalid_questions(self):
+        question = {'text': 'Question', 'type': 'S', 'rating': 1000,
+                    'answers': [['a', True], ['b', False]]}
+        self.import_question(question)
+        for invalid in [
+                {'type': 'X'},
+                {'answers': [['a', True]] * (Question.MAX_ANSWERS + 1)},
+                {'answers': [['a', True, 'b']]},
+                {'text': 7},
+                {'rating': 'high'}]:
+            with self.assertRaisesRegex(ValueError, 'Line 3'):
+                self.import_question(dict(question, **invalid))
+        self.assertEqual(Exam.objects.filter(name='Imported').count(), 1)
+
+
+class AnswerSummaryTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.exam = Exam.objects.create(name='Exam', num_questions=1)
+
+    def setUp(self):
+        self.question = Question.objects.create(
+            exam=self.exam, type='M', text='Question'
+        )
+
+    def assertSummary(self, correct_mask, answers):
+        question = Question.objects.get(id=self.question.id)
+        self.assertEqual(question.correct_mask, correct_mask)
+        self.assertEqual(question.num_answers, len(answers))
+        self.assertEqual(question.fingerprint, Question.get_fingerprint(
+            'Question', 'M', answers
+        ))
+
+    def test_answers_changed(self):
+        self.assertSummary(0, [])
+        a = AnswerChoice.objects.create(
+            question=self.question, text='a', is_correct=False
+        )
+        b = AnswerChoice.objects.create(
+            question=self.question, text='b', is_correct=True
+        )
+        self.assertSummary(0b10, [('a', False), ('b', True)])
+        a.is_correct = True
+        a.save()
+        self.assertSummary(0b11, [('a', True), ('b', True)])
+        b.text = 'c'
+        b.save()
+        self.assertSummary(0b11, [('a', True), ('c', True)])
+        a.delete()
+        self.assertSummary(0b1, [('c', True)])
+
+    def answers_formset(self, answers):
+        formset_class = inlineformset_factory(
+            Question, AnswerChoice, formset=AnswerChoiceFormSet,
+            fields=('text', 'is_correct'), extra=0
+        )
+        data = {
+            'answers-TOTAL_FORMS': len(answers),
+            'answers-INITIAL_FORMS': 0,
+        }
+        for (i, (text, delete)) in enumerate(answers):
+            data['answers-{}-text'.format(i)] = text
+            if delete:
+                data['answers-{}-DELETE'.format(i)] = 'on'
+        return formset_class(data, instance=self.question, prefix='answers')
+
+    def test_admin_answers_limited(self):
+        answers = [('a', False)] * Question.MAX_ANSWERS
+        self.assertTrue(self.answers_formset(answers).is_valid())
+        formset = self.answers_formset(answers + [('b', False)])
+        self.assertFalse(formset.is_valid())
+        self.assertEqual(formset.non_form_errors(), [
+            'A question can have at most 31 answers.'
+        ])
+        # deleted answers are not counted
+        formset = self.answers_formset(answers + [('b', True)])
+        self.assertTrue(formset.is_valid())
+
+
+@override_settings(**TEST_SETTINGS)
+class QuestionIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        uploader = ExamUploader('Exam', 3)
+        uploader.load_csv(io.StringIO('\n'.join(
+            'Question {0},S,{1},a,1,b,0'.format(i, 1000 + 100 * i)
+            for i in range(10)
+        )))
+        cls.exam = uploader.save_to_db()
+
+    def setUp(self):
+        cache.clear()
+        QuestionIndex._exams.clear()
+
+    def ratings(self, peak, num, window):
+        return [
+            q.rating for q in
+            QuestionIndex.get_candidates(self.exam.id, peak, num, window)
+        ]
+
+    def test_window_widened(self):
+        self.assertEqual(self.ratings(1450, 2, 50), [1400, 1500])
+        # 50, 100 and 200 are too narrow
+        self.assertEqual(
+            self.ratings(1450, 4, 50), [1300, 1400, 1500, 1600]
+        )
+        self.assertEqual(self.ratings(1000, 3, 1), [1000, 1100, 1200])
+        # the whole exam when it has fewer questions
+        self.assertEqual(len(self.ratings(1450, 20, 1)), 10)
+
+    def test_invalidated_in_other_processes(self):
+        self.ratings(1450, 10, 1000)
+        stale = QuestionIndex._exams[self.exam.id]
+        question = Question.objects.get(exam=self.exam, rating=1400)
+        question.delete()
+        # another process still holds the index loaded before the delete
+        QuestionIndex._exams[self.exam.id] = stale
+        self.assertNotIn(1400, self.ratings(1450, 10, 1000))
+        self.assertEqual(len(self.ratings(1450, 10, 1000)), 9)
+
+    def test_reloaded_after_timeout(self):
+        self.ratings(1450, 10, 1000)
+        Question.objects.filter(exam=self.exam, rating=1000).update(
+            rating=2000
+        )
+        self.assertIn(1000, self.ratings(1450, 10, 1000))
+        with mock.patch('time.monotonic',
+                        return_value=time.monotonic() +
+                        QuestionIndex.TIMEOUT + 1):
+            self.assertNotIn(1000, self.ratings(1450, 10, 1000))
+
+
+@override_settings(**TEST_SETTINGS)
+class QuestionPoolTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        uploader = ExamUploader('Exam', 3)
+        uploader.load_csv(io.StringIO('\n'.join(
+            'Question {0},S,{1},a,1,b,0'.format(i, 1000 + 50 * i)
+            for i in range(10)
+        )))
+        cls.exam = uploader.save_to_db()
+        cls.question_ids = set(
+            cls.exam.questions.values_list('id', flat=True)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def counts(self):
+        return Counter(
+            QuestionSet.objects.filter(exam=self.exam, user=None)
+                               .values_list('band', flat=True)
+        )
+
+    def test_get_band(self):
+        self.assertEqual(QuestionPool.get_band(1000), 10)
+        self.assertEqual(QuestionPool.get_band(1049), 10)
+        self.assertEqual(QuestionPool.get_band(1050), 11)
+        self.assertEqual(QuestionPool.get_band(950), 10)
+
+    def test_refill_tops_up_missing_sets(self):
+        self.assertEqual(QuestionPool.refill(self.exam, [10, 13], 2), 4)
+        QuestionPool.pop(self.exam, 1000)
+        self.assertEqual(QuestionPool.refill(self.exam, [10, 13, 15], 2), 3)
+        self.assertEqual(self.counts(), {10: 2, 13: 2, 15: 2})
+        self.assertEqual(QuestionPool.refill(self.exam, [10, 13], 2), 0)
+
+    def test_pop(self):
+        QuestionPool.refill(self.exam, [10, 13], 1)
+        question_ids = QuestionPool.pop(self.exam, 1260)
+        self.assertEqual(len(question_ids), 3)
+        self.assertLessEqual(set(question_ids), self.question_ids)
+        self.assertEqual(self.counts(), {10: 1})
+        # the band is empty now and no set is drawn for a far rating
+        self.assertIsNone(QuestionPool.pop(self.exam, 1300))
+        self.assertIsNone(QuestionPool.pop(self.exam, 2000))
+        self.assertIsNotNone(QuestionPool.pop(self.exam, 1000))
+        self.assertEqual(QuestionPool.get_stats(),
+                         {'hits': 2, 'misses': 2})
+
+    def test_pop_set_taken_concurrently(self):
+        QuestionPool.refill(self.exam, [10], 2)
+        delete = QuerySet.delete
+        taken = []
+
+        def delete_taken(queryset):
+            if not taken:
+                # a concurrent request takes the set first
+                taken.append(delete(queryset))
+            return delete(queryset)
+
+        with mock.patch.object(QuerySet, 'delete', autospec=True,
+                               side_effect=delete_taken):
+            self.assertIsNotNone(QuestionPool.pop(self.exam, 1000))
+        self.assertEqual(self.counts(), {})
+        self.assertEqual(QuestionPool.get_stats(),
+                         {'hits': 1, 'misses': 0})
+
+    def test_pop_set_taken_from_every_candidate(self):
+        QuestionPool.refill(self.exam, [10], 1)
+        with mock.patch.object(QuerySet, 'delete', autospec=True,
+                               return_value=(0, {})):
+            self.assertIsNone(QuestionPool.pop(self.exam, 1000))
+        self.assertEqual(QuestionPool.get_stats(),
+                         {'hits': 0, 'misses': 1})
+
+    def test_invalidated_by_question_changes(self):
+        question = self.exam.questions.first()
+        QuestionPool.refill(self.exam, [10, 13], 1)
+        question.save()
+        self.assertEqual(self.counts(), {})
+        QuestionPool.refill(self.exam, [10, 13], 1)
+        question.delete()
+        self.assertEqual(self.counts(), {})
+
+
+@override_settings(**TEST_SETTINGS)
+class ExamUpdateTest(TestCase):
+    """
+    Updates of an exam with a new version of its file, which must keep
+    the unchanged questions with their ratings.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.exam = self.upload(['a', 'b', 'c', 'd'])
+        self.exam.questions.update(rating=1234)
+
+    @staticmethod
+    def upload(texts, exam=None, num_questions=2, progress=None):
+        uploader = ExamUploader('Exam', num_questions, chunk_size=2,
+                                exam=exam)
+        uploader.load_csv(io.StringIO('\n'.join(
+            '{},S,1000,yes,1,no,0'.format(text) for text in texts
+        )))
+        return uploader.save_to_db(progress)
+
+    def questions(self):
+        return dict(self.exam.questions.values_list('id', 'text'))
+
+    def test_unchanged(self):
+        questions = self.questions()
+        self.upload(['d', 'c', 'b', 'a'], self.exam)
+        self.assertEqual(self.questions(), questions)
+        self.assertEqual(
+            set(self.exam.questions.values_list('rating', flat=True)), {1234}
+        )
+
+    def test_edited_row(self):
+        questions = self.questions()
+        with CaptureQueriesContext(connection) as queries:
+            self.upload(['a', 'b', 'c2', 'd'], self.exam)
+        # the edited question is deleted and inserted again
+        for statement in ('DELETE FROM "app_question"',
+                          'INSERT INTO "app_question"'):
+            self.assertEqual(
+                sum(q['sql'].startswith(statement) for q in queries), 1
+            )
+        updated = self.questions()
+        self.assertEqual(set(questions.values()) - set(updated.values()),
+                         {'c'})
+        new_ids = set(updated) - set(questions)
+        self.assertEqual([updated[i] for i in new_ids], ['c2'])
+        self.assertEqual(self.exam.questions.get(text='c2').rating, 1000)
+        self.assertEqual(self.exam.questions.get(text='a').rating, 1234)
+
+    def test_duplicate_rows(self):
+        self.upload(['a', 'a', 'b', 'c', 'd'], self.exam)
+        self.assertEqual(
+            sorted(self.questions().values()), ['a', 'a', 'b', 'c', 'd']
+        )
+        self.assertEqual(self.exam.questions.filter(rating=1234).count(), 4)
+        self.upload(['a', 'b', 'c', 'd'], self.exam)
+        self.assertEqual(
+            sorted(self.questions().values()), ['a', 'b', 'c', 'd']
+        )
+        self.assertEqual(self.exam.questions.filter(rating=1234).count(), 4)
+
+    def test_resized(self):
+        self.upload(['a', 'b'], self.exam)
+        self.assertEqual(sorted(self.questions().values()), ['a', 'b'])
+        self.upload(['a', 'b', 'e', 'f', 'g', 'h'], self.exam,
+                    num_questions=3)
+        self.assertEqual(sorted(self.questions().values()),
+                         ['a', 'b', 'e', 'f', 'g', 'h'])
+        self.exam.refresh_from_db()
+        self.assertEqual(self.exam.num_questions, 3)
+
+    def test_cancelled(self):
+        questions = self.questions()
+        QuestionPool.refill(self.exam, [10], 1)
+
+        def progress(saved_rows):
+            raise ImportCancelled()
+
+        with self.assertRaises(ImportCancelled):
+            self.upload(['e', 'f', 'g'], self.exam, num_questions=3,
+                        progress=progress)
+        self.assertEqual(self.questions(), questions)
+        self.exam.refresh_from_db()
+        self.assertEqual(self.exam.num_questions, 2)
+        self.assertEqual(QuestionSet.objects.count(), 1)
+        self.upload(['e', 'f', 'g'], self.exam, num_questions=3)
+        self.assertFalse(QuestionSet.objects.exists())
+
+
+@override_settings(**TEST_SETTINGS)
+class ImportJobTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media_root = override_settings(MEDIA_ROOT=directory.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
+    @staticmethod
+    def create_job(rows=5, **kwargs):
+        content = '\n'.join(
+            'Question {0},S,1000,a,1,b,0'.format(i) for i in range(rows)
+        )
+        return ImportJob.objects.create(
+            file=SimpleUploadedFile('exam.csv', content.encode('utf8')),
+            exam_name='Exam', num_questions=3, **kwargs
+        )
+
+    def test_run_pending(self):
+        first = self.create_job(rows=5)
+        second = self.create_job(rows=4)
+        path = first.file.path
+        self.assertEqual(ImportJobRunner.run_pending(), 2)
+        first.refresh_from_db()
+        self.assertEqual(first.status, ImportJob.DONE)
+        self.assertEqual((first.total_rows, first.saved_rows), (5, 5))
+        self.assertEqual(first.exam.questions.count(), 5)
+        self.assertFalse(first.file)
+        self.assertFalse(os.path.exists(path))
+        second.refresh_from_db()
+        self.assertEqual(second.exam.questions.count(), 4)
+        self.assertEqual(ImportJobRunner.run_pending(), 0)
+
+    def test_claim_in_order(self):
+        first = self.create_job()
+        second = self.create_job()
+        self.assertEqual(ImportJobRunner._claim_next(), first)
+        self.assertEqual(ImportJobRunner._claim_next(), second)
+        self.assertIsNone(ImportJobRunner._claim_next())
+        first.refresh_from_db()
+        self.assertEqual(first.status, ImportJob.RUNNING)
+        self.assertIsNotNone(first.heartbeat_date)
+
+    def test_progress(self):
+        self.create_job(rows=7)
+        job = ImportJobRunner._claim_next()
+        reported = []
+        save_to_db = ExamUploader.save_to_db
+
+        def save_in_chunks(uploader, progress):
+            uploader._chunk_size = 3
+
+            def report(saved_rows):
+                progress(saved_rows)
+                reported.append(
+                    ImportJob.objects.values_list(
+                        'total_rows', 'saved_rows'
+                    ).get(id=job.id)
+                )
+            return save_to_db(uploader, report)
+
+        with mock.patch.object(ExamUploader, 'save_to_db', autospec=True,
+                               side_effect=save_in_chunks):
+            ImportJobRunner.run(job)
+        self.assertEqual(reported, [(7, 3), (7, 6), (7, 7)])
+
+    def test_invalid_file(self):
+        job = self.create_job(rows=2)
+        ImportJobRunner.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.FAILED)
+        self.assertEqual(job.message, 'Not enough questions')
+        self.assertFalse(Exam.objects.exists())
+
+    def test_cancel_pending(self):
+        job = self.create_job()
+        path = job.file.path
+        ImportJobRunner.cancel(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.CANCELLED)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(ImportJobRunner.run_pending(), 0)
+
+    def test_cancel_running(self):
+        self.create_job()
+        job = ImportJobRunner._claim_next()
+        ImportJobRunner.cancel(job.id)
+        ImportJobRunner.run(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.CANCELLED)
+        # the new exam is removed
+        self.assertFalse(Exam.objects.exists())
+        # finished jobs are left unchanged
+        ImportJobRunner.cancel(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.CANCELLED)
+
+    def test_stale_job_failed(self):
+        stale = self.create_job()
+        running = self.create_job()
+        ImportJob.objects.update(status=ImportJob.RUNNING)
+        now = timezone.now()
+        ImportJob.objects.filter(id=stale.id).update(
+            heartbeat_date=now - datetime.timedelta(
+                seconds=ImportJobRunner.STALE_TIMEOUT + 1
+            )
+        )
+        ImportJob.objects.filter(id=running.id).update(heartbeat_date=now)
+        pending = self.create_job()
+        self.assertEqual(ImportJobRunner._claim_next(), pending)
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, ImportJob.FAILED)
+        self.assertFalse(stale.file)
+        running.refresh_from_db()
+        self.assertEqual(running.status, ImportJob.RUNNING)
+
+
+def sequential_choices(questions, num, peak, rng):
+    """
+    Draws the questions one by one with probability proportional to their
+    weights, as the sampler did before the single pass one.
+    """
+    weights = RandomQuestion.get_weights(questions, peak)
+    chosen = []
+    while len(chosen) < num:
+        rand = rng.uniform(0, sum(weights))
+        cumulative = 0
+        for (i, weight) in enumerate(weights):
+            cumulative += weight
+            if cumulative > rand:
+                chosen.append(questions[i])
+                weights[i] = 0
+                break
+    return chosen
+
+
+class RandomQuestionTest(SimpleTestCase):
+    """
+    Compares the frequencies of drawing each question, and of drawing it
+    first, with the sequential sampler over many seeded draws.
+    """
+
+    DRAWS = 4000
+    # over four standard deviations of the difference of the frequencies
+    TOLERANCE = 0.05
+
+    questions = [RatedQuestion(i, 700 + 50 * i) for i in range(24)]
+
+    @staticmethod
+    def count(sets, first=False):
+        return Counter(q.id for s in sets for q in (s[:1] if first else s))
+
+    def assertSameFrequencies(self, sets, expected_sets):
+        for first in (False, True):
+            counts = self.count(sets, first)
+            expected = self.count(expected_sets, first)
+            for question in self.questions:
+                self.assertAlmostEqual(
+                    counts[question.id] / self.DRAWS,
+                    expected[question.id] / self.DRAWS,
+                    delta=self.TOLERANCE,
+                    msg='question {}'.format(question.id)
+                )
+
+    def draw_expected(self, num, peak):
+        rng = random.Random(1)
+        return [
+            sequential_choices(self.questions, num, peak, rng)
+            for _ in range(self.DRAWS)
+        ]
+
+    def test_get_choices(self):
+        rng = random.Random(2)
+        for (num, peak) in [(6, 1300), (12, 800)]:
+            sets = [
+                RandomQuestion.get_choices(self.questions, num, peak, rng=rng)
+                for _ in range(self.DRAWS)
+            ]
+            self.assertTrue(all(len(set(s)) == num for s in sets))
+            self.assertSameFrequencies(sets, self.draw_expected(num, peak))
+
+    def test_get_choices_batch(self):
+        sets = RandomQuestion.get_choices_batch(
+            self.questions, 6, [1300] * self.DRAWS, seed=3
+        )
+        self.assertSameFrequencies(sets, self.draw_expected(6, 1300))
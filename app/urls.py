@@ -20,6 +20,9 @@ exam_urlpatterns = [
     url(r'^start/([0-9]+)/$', views.exam.exam_start_view, name='start'),
     url(r'^question/$', views.exam.question_view, name='question'),
     url(r'^finished/$', views.exam.finished_view, name='finished'),
+    url(r'^attempt/$', views.exam.attempt_view, name='attempt'),
+    url(r'^attempt/submit/$', views.exam.attempt_submit_view,
+        name='attempt_submit'),
 ]
 
 urlpatterns = [
@@ -1,39 +1,43 @@
+import json
+
 from django.contrib.auth.decorators import login_required
-from django.db.models import Min, Max
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from django.utils import timezone
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_POST
 
-from app.exam_tools import RandomQuestion, AnswerScore
+from app.attempts import AttemptSnapshot, AttemptToken
+from app.exam_lists import UserExamList
+from app.exam_tools import (RandomQuestion, AnswerScore, QuestionIndex,
+                            QuestionPool, QuestionSetGenerator)
 from app.forms import ExamCodeForm, QuestionForm
-from app.models import Exam, Question
+from app.models import Exam, ExamAttempt
 
 
 @login_required
 def exams_list_view(request):
     """
     Displays the list of exams add currently available to the user.
+    Past exams are paginated with the cursor of the next page passed in
+    the ``before`` parameter.
     
     name: exam:list
     URL: /exam/list/
     """
-    today = timezone.now().date()
-    user_id = request.user.id
-
-    # Future exams sorted by the closest due date
-    exams = (Exam.objects
-             .filter(group__members__id=user_id)
-             .filter(groupexamlink__due_date__gte=today)
-             .annotate(closest_due_date=Min('groupexamlink__due_date'))
-             .order_by('closest_due_date'))
-    old_exams = (Exam.objects
-                 .filter(group__members__id=user_id)
-                 .filter(groupexamlink__due_date__lt=today)
-                 .annotate(closest_due_date=Max('groupexamlink__due_date'))
-                 .exclude(groupexamlink__due_date__gte=today)
-                 .order_by('-closest_due_date'))
+    # Future exams sorted by the closest due date and past exams
+    # sorted by the latest due date
+    exams, old_exams, next_cursor = UserExamList.get(request.user.id)
+    cursor = request.GET.get('before')
+    if cursor:
+        try:
+            old_exams, next_cursor = UserExamList.get_old_exams(
+                request.user.id, cursor
+            )
+        except ValueError:
+            return redirect('exam:list')
     return render(
         request, 'exam/list.html',
-        {'exams': exams, 'old_exams': old_exams}
+        {'exams': exams, 'old_exams': old_exams, 'next_cursor': next_cursor}
     )
 
 
@@ -45,11 +49,10 @@ def exam_info_view(request, exam_id):
     name: exam:info
     URL: /exam/info/<exam_id>
     """
-    queryset = (Exam.objects
-                .prefetch_related('groupexamlink_set__group')
-                .prefetch_related('groupexamlink_set__group'))
-    exam = get_object_or_404(queryset, id=exam_id)
-    group_exam_links = exam.groupexamlink_set.order_by('-due_date').all()
+    exam = get_object_or_404(Exam, id=exam_id)
+    group_exam_links = (exam.groupexamlink_set
+                            .select_related('group')
+                            .order_by('-due_date'))
     return render(
         request, 'exam/info.html',
         {'exam': exam, 'assigns': group_exam_links}
@@ -58,19 +61,28 @@ def exam_info_view(request, exam_id):
 
 @login_required
 def exam_start_view(request, exam_id):
+    """
+    Asks for the exam code and starts the exam attempt with a set of
+    questions drawn for the user.
+
+    name: exam:start
+    URL: /exam/start/<exam_id>/
+    """
     exam = get_object_or_404(Exam, id=exam_id)
     form = ExamCodeForm(request.POST or None, exam=exam)
     if form.is_valid():
-        exam = (Exam.objects.prefetch_related('questions')
-                            .get(id=exam_id))
-        questions = RandomQuestion.get_choices(
-            questions=exam.questions.all(),
-            num=exam.num_questions,
-            peak=request.user.userx.rating
+        # an unfinished attempt is closed with the answers given so far
+        _finish_attempt(request)
+        user_rating = request.user.userx.rating
+        question_ids = (QuestionSetGenerator.pop(exam, request.user) or
+                        QuestionPool.pop(exam, user_rating) or
+                        _draw_questions(exam, user_rating))
+        attempt = AttemptSnapshot.create(
+            exam, request.user, question_ids, user_rating
         )
-        request.session['exam_id'] = exam.id
-        request.session['current_question'] = 0
-        request.session['questions'] = [q.id for q in questions]
+        request.session['attempt'] = AttemptToken(
+            attempt.attempt_id, 0
+        ).dumps()
         return redirect('exam:question')
     return render(
         request, 'exam/enter_code.html',
@@ -78,57 +90,239 @@ def exam_start_view(request, exam_id):
     )
 
 
+def _draw_questions(exam, peak):
+    """
+    Draws the questions of the exam attempt.
+
+    :param Exam exam: exam being started
+    :param int peak: rating of the user starting the exam
+    :return: ids of the questions in the order they are asked
+    :rtype: list[int]
+    """
+    questions = RandomQuestion.get_choices(
+        questions=QuestionIndex.get_candidates(
+            exam.id, peak, exam.num_questions
+        ),
+        num=exam.num_questions,
+        peak=peak
+    )
+    return [q.id for q in questions]
+
+
+def _load_attempt(request):
+    """
+    Loads the snapshot of the ongoing exam attempt of the session. If the
+    snapshot expired from the cache, it is restored from the database.
+    Finished attempts are not restored.
+
+    :return: snapshot of the attempt and whether the session token is
+        up to date with it, None if there is no attempt
+    :rtype: (AttemptSnapshot | None, bool)
+    """
+    try:
+        token = AttemptToken.loads(request.session.get('attempt', ''))
+    except (ValueError, TypeError):
+        return (None, False)
+    attempt = AttemptSnapshot.load(token.attempt_id)
+    if attempt is None:
+        attempt = AttemptSnapshot.restore(token.attempt_id, request.user)
+        if attempt is None:
+            return (None, False)
+    # the position of the snapshot wins over a token from an older session
+    if token.position != attempt.position:
+        request.session['attempt'] = token._replace(
+            position=attempt.position
+        ).dumps()
+        return (attempt, False)
+    return (attempt, True)
+
+
+def _save_attempt(request, attempt):
+    """
+    Saves the snapshot of the attempt and the position in the session.
+
+    :param AttemptSnapshot attempt: snapshot of the ongoing attempt
+    """
+    attempt.save()
+    token = AttemptToken.loads(request.session['attempt'])
+    request.session['attempt'] = token._replace(
+        position=attempt.position
+    ).dumps()
+
+
+def _finish_attempt(request):
+    """
+    Finishes the ongoing attempt of the session if there is any, saving
+    its result. The attempt is finished even if its snapshot expired.
+    """
+    try:
+        token = AttemptToken.loads(request.session.pop('attempt', ''))
+    except (ValueError, TypeError):
+        return
+    AttemptSnapshot.finish_attempts(
+        ExamAttempt.objects.filter(
+            attempt_id=token.attempt_id, user=request.user
+        )
+    )
+    AttemptSnapshot.discard(token.attempt_id)
+
+
 @login_required
 def question_view(request):
     """
     Shows a next question to the user and manages the answers.
-    Checks for an ongoing exam and picks a question from the list.
-    Answers are checked and user's score is adjusted accordingly.
+    Checks for an ongoing exam and picks a question from the attempt
+    snapshot. Answers are checked and user's score is adjusted accordingly.
     
     name: exam:question
     URL: /exam/question/
     """
-    exam_id = request.session.get('exam_id')
-    if exam_id is None:
+    if 'attempt' not in request.session:
         return redirect('exam:list')
-    exam = Exam.objects.get(id=exam_id)
-    question_id = (
-        request.session['questions'][request.session['current_question']]
-    )
-    question = Question.objects.get(id=question_id)
-    answers = question.answers.all()
+    (attempt, current) = _load_attempt(request)
+    if attempt is None:
+        return redirect('exam:finished')
+    question_no = attempt.position
+    if question_no >= attempt.num_questions:
+        return redirect('exam:finished')
+    if request.method == 'POST' and not current:
+        # the answer was sent with a used token, e.g. resubmitted
+        return redirect('exam:question')
+    question = attempt.questions[question_no]
     form = QuestionForm(
         request.POST or None,
         question_type=question.type,
-        answer_choices=[(ans.id, ans.text) for ans in answers]
+        answer_choices=question.answers
     )
     if form.is_valid():
-        score_change = AnswerScore.get_rating_change(
-            question=question,
-            answer_choices=answers,
-            answer=form.cleaned_data['answer'],
-            user_rating=request.user.userx.rating
+        answer_mask = question.get_answer_mask(form.cleaned_data['answer'])
+        [grade] = AnswerScore.grade_answers(
+            questions=[question],
+            answer_masks=[answer_mask],
+            user_rating=attempt.user_rating
         )
-        request.user.userx.rating += score_change
-        question.rating -= score_change
-        request.user.userx.save()
-        question.save()
-        request.session['current_question'] += 1
-        if request.session['current_question'] >= exam.num_questions:
+        score_change = round(grade.rating_change)
+        attempt.user_rating += score_change
+        attempt.position += 1
+        _save_attempt(request, attempt)
+        # queued once the attempt moved on, so a resubmitted answer is
+        # rejected rather than saved again
+        attempt.record_answers(
+            [(question, answer_mask, grade.score, score_change)]
+        )
+        if attempt.position >= attempt.num_questions:
             return redirect('exam:finished')
         else:
             return redirect('exam:question')
     return render(
         request, 'exam/question.html',
         {
-            'exam_name': exam.name,
+            'exam_name': attempt.exam_name,
             'question': question, 'form': form,
-            'question_no': request.session['current_question'],
-            'num_questions': exam.num_questions
+            'question_no': question_no,
+            'num_questions': attempt.num_questions
         }
     )
 
 
+@login_required
+@ensure_csrf_cookie
+def attempt_view(request):
+    """
+    Returns all the remaining questions of the ongoing exam attempt with
+    their answer choices as a single JSON document, so the whole exam can
+    be taken without a request per question.
+
+    name: exam:attempt
+    URL: /exam/attempt/
+    """
+    (attempt, _) = _load_attempt(request)
+    if attempt is None:
+        return JsonResponse({'error': 'No exam in progress'}, status=404)
+    return JsonResponse({
+        'exam_name': attempt.exam_name,
+        'questions': [
+            {
+                'id': question.id,
+                'type': question.type,
+                'text': question.text,
+                'answers': [
+                    {'id': ans_id, 'text': ans_text}
+                    for (ans_id, ans_text) in question.answers
+                ]
+            }
+            for question in attempt.questions[attempt.position:]
+        ]
+    })
+
+
+@login_required
+@require_POST
+def attempt_submit_view(request):
+    """
+    Grades the answers to all the remaining questions of the ongoing exam
+    attempt at once and finishes the attempt. Expects a JSON object
+    mapping question ids to the answer id (single choice) or a list of
+    answer ids (multiple choice). Every remaining question must be
+    answered, missing answers are reported as errors like invalid ones.
+
+    name: exam:attempt_submit
+    URL: /exam/attempt/submit/
+    """
+    (attempt, _) = _load_attempt(request)
+    if attempt is None:
+        return JsonResponse({'error': 'No exam in progress'}, status=404)
+    try:
+        data = json.loads(request.body.decode('utf8'))
+        submitted = {int(key): value for (key, value) in data.items()}
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Invalid JSON document'}, status=400)
+    questions = attempt.questions[attempt.position:]
+    answers = []
+    errors = {}
+    for question in questions:
+        form = QuestionForm(
+            {'answer': submitted[question.id]}
+            if question.id in submitted else {},
+            question_type=question.type,
+            answer_choices=question.answers
+        )
+        if form.is_valid():
+            answers.append(form.cleaned_data['answer'])
+        else:
+            errors[question.id] = form.errors['answer']
+    if errors:
+        return JsonResponse({'errors': errors}, status=400)
+    answer_masks = [
+        question.get_answer_mask(answer)
+        for (question, answer) in zip(questions, answers)
+    ]
+    grades = AnswerScore.grade_answers(
+        questions=questions,
+        answer_masks=answer_masks,
+        user_rating=attempt.user_rating
+    )
+    results = []
+    records = []
+    for (question, answer_mask, grade) in zip(questions, answer_masks,
+                                              grades):
+        score_change = round(grade.rating_change)
+        records.append((question, answer_mask, grade.score, score_change))
+        attempt.user_rating += score_change
+        results.append({
+            'id': question.id, 'score': grade.score,
+            'rating_change': score_change
+        })
+    AttemptSnapshot.discard(attempt.attempt_id)
+    del request.session['attempt']
+    # queued once the attempt is closed, so a resubmitted exam is not
+    # graded again; finishing the attempt writes the queued answers
+    attempt.record_answers(records)
+    attempt.finish()
+    return JsonResponse({'results': results, 'rating': attempt.user_rating})
+
+
 @login_required
 def finished_view(request):
-    return redirect('exam:list')
\ No newline at end of file
+    _finish_attempt(request)
+    return redirect('exam:list')
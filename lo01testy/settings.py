@@ -41,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.middleware.QueryBudgetMiddleware',
+    'app.middleware.ReplicaStickinessMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -83,6 +85,94 @@ DATABASES = {
     }
 }
 
+# Aliases of the read replicas of the default database. Reads are spread
+# over the replicas, except for clients which wrote in the last
+# REPLICA_STICKY_SECONDS, see lo01testy/settings_replica.py
+DATABASE_ROUTERS = ['app.routers.ReplicaRouter']
+DATABASE_REPLICAS = []
+REPLICA_STICKY_SECONDS = 10
+
+
+# Exam questions
+
+# Questions with ratings further than this from the student's rating are
+# not considered when drawing the exam, unless there are too few questions.
+QUESTION_RATING_WINDOW = 900
+
+# Number of question sets kept ready for each rating band of an exam
+# by the refill_question_pools command.
+QUESTION_POOL_SIZE = 20
+
+# Answers and the rating changes they cause are queued and written in
+# batches by a background thread, when FLUSH_SIZE answers are queued or
+# FLUSH_INTERVAL seconds after the first one, and when an attempt ends.
+# SYNCHRONOUS mode writes each answer immediately in the request.
+RATING_UPDATES = {
+    'FLUSH_SIZE': 100,
+    'FLUSH_INTERVAL': 2,
+    'SYNCHRONOUS': False,
+}
+
+
+# Query budgets
+
+# Maximum number of database queries of a request to each view, including
+# the session and user queries (none for signed cookie sessions), for the
+# most expensive path through the view. Requests over the budget fail when
+# QUERY_BUDGET_CHECK is on. The query counts of each path are pinned by
+# the tests in app/tests.py.
+QUERY_BUDGET_CHECK = DEBUG
+QUERY_BUDGETS = {
+    'accounts:login': 3,
+    'accounts:profile': 1,
+    'exam:list': 3,
+    'exam:info': 3,
+    # an unfinished attempt is finished first
+    'exam:start': 11,
+    # an expired attempt is restored after writing the queued answers, or
+    # the answer is written in the SYNCHRONOUS mode
+    'exam:question': 10,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+
+# The cache is shared with the management commands running in separate
+# processes, so it must not be process-local.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {
+            # room for the snapshots of all the ongoing exam attempts;
+            # a third of the entries is culled when the limit is reached
+            'MAX_ENTRIES': 20000,
+        },
+    }
+}
+
+
+# Sessions
+# https://docs.djangoproject.com/en/1.11/topics/http/sessions/
+
+# Sessions are kept in signed cookies, so answering a question updates
+# the cookie rather than a database row. Use
+# 'django.contrib.sessions.backends.cached_db' to keep the session data
+# on the server, at the cost of a write on every change.
+SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+
+
+# Authentication
+# https://docs.djangoproject.com/en/1.11/topics/auth/customizing/
+
+# Users are loaded with their profiles in one query. The default backend
+# keeps the sessions created before the change valid.
+AUTHENTICATION_BACKENDS = [
+    'app.backends.UserProfileBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
@@ -125,3 +215,8 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = (
     os.path.join(BASE_DIR, "static"),
 )
+
+
+# Uploaded files
+
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
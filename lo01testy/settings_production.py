@@ -0,0 +1,43 @@
+"""
+Production settings for lo01testy project running on a single sqlite
+database shared by several worker processes.
+
+Use with DJANGO_SETTINGS_MODULE=lo01testy.settings_production and set
+the DJANGO_SECRET_KEY and DJANGO_ALLOWED_HOSTS environment variables.
+"""
+
+from lo01testy.settings import *  # noqa
+
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+
+DEBUG = False
+
+QUERY_BUDGET_CHECK = False
+
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',')
+
+
+# Database
+
+# Connections are kept open between requests, so the pragmas are set once
+# per connection. A writer waits up to 'timeout' seconds for the lock held
+# by another process instead of failing with "database is locked".
+#
+# In the WAL journal mode readers do not block the writer and the writer
+# does not block readers. synchronous=NORMAL is safe with WAL and syncs
+# the journal at checkpoints only. The database file is memory-mapped
+# and each connection keeps up to 64MB of pages in its cache.
+DATABASES['default'].update({
+    'ENGINE': 'app.db',
+    'CONN_MAX_AGE': 600,
+    'OPTIONS': {
+        'timeout': 20,
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -64 * 1024,
+            'temp_store': 'MEMORY',
+        },
+    },
+})
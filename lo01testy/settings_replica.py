@@ -0,0 +1,26 @@
+"""
+Settings for lo01testy project reading from a replica of the database.
+
+The replica is a second sqlite file, a copy of the primary database made
+by the sync_replica command, which lets the routing be tried locally:
+
+    python manage.py migrate --settings=lo01testy.settings_replica
+    python manage.py sync_replica --interval 5 \\
+        --settings=lo01testy.settings_replica
+"""
+
+from lo01testy.settings import *  # noqa
+
+# a new dict, so the imported settings are left unchanged
+DATABASES = dict(DATABASES, replica={
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': os.path.join(BASE_DIR, 'db_replica.sqlite3'),
+    'TEST': {
+        'MIRROR': 'default',
+    },
+})
+
+DATABASE_REPLICAS = ['replica']
+
+# must be longer than the sync interval
+REPLICA_STICKY_SECONDS = 10